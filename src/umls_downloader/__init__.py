@@ -2,8 +2,20 @@
 
 """Automate downloading content from the UMLS Terminology Services (UTS)."""
 
-from .api import download_tgt, download_tgt_versioned  # noqa:F401
-from .rxnorm import download_rxnorm, download_rxnorm_prescribable  # noqa:F401
+from .api import RateLimiter, download_tgt, download_tgt_versioned, stream_tgt  # noqa:F401
+from .extract import extract_archive  # noqa:F401
+from .frame import CategoricalFrame, build_categorical_frame, load_umls_frame  # noqa:F401
+from .fuzzy import FuzzyIndex, FuzzyMatch, build_fuzzy_index, ensure_fuzzy_index  # noqa:F401
+from .graph import UMLSGraph, build_umls_graph, ensure_umls_graph  # noqa:F401
+from .lexicon import Lexicon, build_lexicon, ensure_lexicon  # noqa:F401
+from .rxnorm import (  # noqa:F401
+    RxNormIndex,
+    build_rxnorm_index,
+    download_rxnorm,
+    download_rxnorm_prescribable,
+    ensure_rxnorm_index,
+    iter_rxnorm,
+)
 from .semmeddb import (  # noqa:F401
     download_semmeddb_citations,
     download_semmeddb_concept,
@@ -12,13 +24,31 @@ from .semmeddb import (  # noqa:F401
     download_semmeddb_predication_aux,
     download_semmeddb_sentence,
 )
-from .snomed import download_snomed_international, download_snomed_us  # noqa:F401
+from .snomed import (  # noqa:F401
+    SnomedConcepts,
+    SnomedDescriptions,
+    SnomedRelationships,
+    download_snomed_international,
+    download_snomed_us,
+    load_snomed_concepts,
+    load_snomed_descriptions,
+    load_snomed_relationships,
+)
+from .snomed_hierarchy import (  # noqa:F401
+    SnomedHierarchy,
+    build_snomed_hierarchy,
+    ensure_snomed_hierarchy,
+)
+from .stream import iter_zip_stream  # noqa:F401
+from .sync import load_manifest, plan_sync, sync  # noqa:F401
 from .umls import (  # noqa:F401
     download_umls,
     download_umls_full,
     download_umls_metathesaurus,
+    ensure_umls_subset,
     open_umls,
     open_umls_full,
     open_umls_hierarchy,
     open_umls_semantic_types,
+    open_umls_subset,
 )
@@ -2,19 +2,25 @@
 
 """Download functionality for the UMLS ticket granting system."""
 
+import json
 import logging
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Callable, Optional, Union
+from typing import Callable, Dict, Iterator, Mapping, Optional, Tuple, Union
 
 import bs4
 import pystow
-import pystow.utils
 import requests
 from pystow.utils import name_from_url
+from tqdm.auto import tqdm
 
 __all__ = [
+    "RateLimiter",
     "download_tgt",
     "download_tgt_versioned",
+    "stream_tgt",
 ]
 
 logger = logging.getLogger(__name__)
@@ -22,26 +28,43 @@ logger = logging.getLogger(__name__)
 MODULE = pystow.module("bio", "umls")
 TGT_URL = "https://utslogin.nlm.nih.gov/cas/v1/api-key"
 
+#: The response headers that are stored next to downloaded files for revalidation
+VALIDATOR_HEADERS = ("ETag", "Last-Modified", "Content-Length")
 
-def download_tgt(
-    url: str, path: Union[str, Path], *, api_key: Optional[str] = None, force: bool = False
-) -> None:
-    """Download a file via the UMLS ticket granting system.
 
-    This implementation is based on the instructions listed at
-    https://documentation.uts.nlm.nih.gov/automating-downloads.html.
+class RateLimiter:
+    """A thread-safe token bucket for limiting the total bandwidth of downloads."""
 
-    :param url: The URL of the file to download, like
-        ``https://download.nlm.nih.gov/umls/kss/2021AB/umls-2021AB-mrconso.zip``
-    :param path: The local file path where the file should be downloaded
-    :param api_key: An API key. If not given, is looked up using
-        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
-    :param force: Should the file be re-downloaded?
-    """
-    path = Path(path).resolve()
-    if path.is_file() and not force:
-        return
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """Initialize the rate limiter.
 
+        :param rate: The maximum number of bytes per second
+        :param burst: The maximum number of bytes that can be consumed at once
+            after being idle. Defaults to one second's worth.
+        """
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n: int) -> None:
+        """Block until the given number of bytes can be consumed.
+
+        :param n: The number of bytes
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # going into debt makes concurrent callers queue up behind this one
+            self._tokens -= n
+            debt = -self._tokens
+        if debt > 0:
+            time.sleep(debt / self.rate)
+
+
+def _get_service_ticket(url: str, api_key: Optional[str] = None) -> str:
     api_key = pystow.get_config("umls", "api_key", passthrough=api_key, raise_on_missing=True)
 
     # Step 1: get a link to the ticket granting system (TGT)
@@ -59,42 +82,212 @@ def download_tgt(
     # luckily this one just returns the text you need
     service_ticket = key_res.text
     logger.info("[umls] got service ticket: %s", service_ticket)
+    return service_ticket
+
+
+def _get_validators_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.validators.json")
+
+
+def _read_validators(path: Path) -> Optional[Dict[str, str]]:
+    validators_path = _get_validators_path(path)
+    if not validators_path.is_file():
+        return None
+    return json.loads(validators_path.read_text())
+
+
+def _write_validators(path: Path, headers: Mapping[str, str]) -> None:
+    validators = {key: headers[key] for key in VALIDATOR_HEADERS if key in headers}
+    _get_validators_path(path).write_text(json.dumps(validators, indent=2))
+
+
+def _is_unchanged(validators: Mapping[str, str], headers: Mapping[str, str]) -> bool:
+    """Check if a response is for the same file as the stored validators describe."""
+    if "ETag" in validators and "ETag" in headers:
+        return validators["ETag"] == headers["ETag"]
+    if "Last-Modified" not in validators or "Last-Modified" not in headers:
+        # without a validator, there's no way to tell, so assume it changed
+        return False
+    return validators["Last-Modified"] == headers["Last-Modified"] and validators.get(
+        "Content-Length"
+    ) == headers.get("Content-Length")
+
+
+def _download(
+    url: str,
+    path: Path,
+    *,
+    params: Mapping[str, str],
+    rate_limiter: Optional[RateLimiter] = None,
+    validators: Optional[Mapping[str, str]] = None,
+) -> bool:
+    """Stream a file to the given path, unless it's unchanged from the given validators.
+
+    :param url: The URL of the file to download
+    :param path: The local file path where the file should be downloaded. It is
+        only replaced once the whole file has been written next to it.
+    :param params: The query parameters, like the service ticket
+    :param rate_limiter: A rate limiter for the bandwidth of the download
+    :param validators: The validators stored when the file was last downloaded.
+        If given, a conditional request is made and the file is only downloaded
+        if it changed. An empty dictionary never matches.
+    :returns: If the file was downloaded
+    """
+    headers = {}
+    if validators:
+        if "ETag" in validators:
+            headers["If-None-Match"] = validators["ETag"]
+        if "Last-Modified" in validators:
+            headers["If-Modified-Since"] = validators["Last-Modified"]
+    tmp_path = path.with_name(path.name + ".part")
+    completed = False
+    try:
+        with requests.get(url, params=params, headers=headers, stream=True) as res:
+            # the server might ignore the conditional headers, so the validators are also
+            # checked here, before any of the body is read
+            if validators is not None and (
+                res.status_code == 304 or (res.ok and _is_unchanged(validators, res.headers))
+            ):
+                logger.info("[umls] %s is unchanged, not re-downloading", url)
+                return False
+            res.raise_for_status()
+            total = int(res.headers.get("Content-Length", 0)) or None
+            with tmp_path.open("wb") as file, tqdm(
+                total=total,
+                unit="B",
+                unit_scale=True,
+                unit_divisor=1024,
+                desc=f"Downloading {path.name}",
+                leave=False,
+            ) as progress:
+                for chunk in res.iter_content(chunk_size=1 << 16):
+                    if rate_limiter is not None:
+                        rate_limiter.consume(len(chunk))
+                    file.write(chunk)
+                    progress.update(len(chunk))
+        completed = True
+    finally:
+        # clean up after errors and interruptions
+        if not completed and tmp_path.exists():
+            tmp_path.unlink()
+    tmp_path.replace(path)
+    _write_validators(path, res.headers)
+    return True
+
+
+def download_tgt(
+    url: str,
+    path: Union[str, Path],
+    *,
+    api_key: Optional[str] = None,
+    force: bool = False,
+    revalidate: bool = False,
+    rate_limiter: Optional[RateLimiter] = None,
+) -> None:
+    """Download a file via the UMLS ticket granting system.
+
+    This implementation is based on the instructions listed at
+    https://documentation.uts.nlm.nih.gov/automating-downloads.html.
+
+    :param url: The URL of the file to download, like
+        ``https://download.nlm.nih.gov/umls/kss/2021AB/umls-2021AB-mrconso.zip``
+    :param path: The local file path where the file should be downloaded
+    :param api_key: An API key. If not given, is looked up using
+        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
+    :param force: Should the file be re-downloaded?
+    :param revalidate: If the file already exists, should it only be re-downloaded
+        if the remote file has changed? This uses the ETag, Last-Modified, and
+        Content-Length headers that are stored next to the file in a
+        ``.validators.json`` file when it's downloaded. Files without stored
+        validators are re-downloaded.
+    :param rate_limiter: A rate limiter, which can be shared between concurrent
+        downloads to cap their total bandwidth
+    """
+    path = Path(path).resolve()
+    validators = None
+    if path.is_file() and not force:
+        if not revalidate:
+            return
+        # an empty dictionary still makes a conditional request, but never matches
+        validators = _read_validators(path) or {}
+
+    service_ticket = _get_service_ticket(url, api_key=api_key)
 
     # Step 3: actually try downloading the file you want, using the
     # service ticket issued in the last step as a query parameter
-    pystow.utils.download(
-        url=url,
-        path=path,
-        backend="requests",
+    _download(
+        url,
+        path,
         params={"ticket": service_ticket},
+        rate_limiter=rate_limiter,
+        validators=validators,
     )
 
 
-def download_tgt_versioned(
+@contextmanager
+def stream_tgt(
+    url: str,
+    path: Union[str, Path],
+    *,
+    api_key: Optional[str] = None,
+    chunk_size: int = 1 << 16,
+):
+    """Stream a file via the UMLS ticket granting system while also writing it to a path.
+
+    :param url: The URL of the file to download
+    :param path: The local file path where the file should be written
+    :param api_key: An API key. If not given, is looked up using
+        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
+    :param chunk_size: The number of bytes to read from the response at a time
+    :yields: An iterator over the chunks of the file as they arrive. Whatever
+        isn't consumed from it by the end of the context is still downloaded,
+        so the file at the given path is complete. If an error is raised
+        inside the context, the partial file is removed instead.
+    """
+    path = Path(path).resolve()
+    tmp_path = path.with_name(path.name + ".part")
+    service_ticket = _get_service_ticket(url, api_key=api_key)
+    completed = False
+    with requests.get(url, params={"ticket": service_ticket}, stream=True) as res:
+        res.raise_for_status()
+        try:
+            with tmp_path.open("wb") as file:
+                chunks = _tee(res.iter_content(chunk_size=chunk_size), file.write)
+                yield chunks
+                for _ in chunks:
+                    pass
+            completed = True
+        finally:
+            # clean up after errors in the context, and after the context is abandoned
+            if not completed and tmp_path.exists():
+                tmp_path.unlink()
+    tmp_path.replace(path)
+    _write_validators(path, res.headers)
+
+
+def _tee(chunks: Iterator[bytes], write: Callable[[bytes], object]) -> Iterator[bytes]:
+    for chunk in chunks:
+        write(chunk)
+        yield chunk
+
+
+def _resolve_versioned(
     url_fmt: str,
     version: Optional[str] = None,
     *,
     module_key: str,
     version_key: str,
-    api_key: Optional[str] = None,
-    force: bool = False,
     version_transform: Optional[Callable[[str], str]] = None,
-) -> Path:
-    """Download a file via the UMLS ticket granting system.
+) -> Tuple[str, Path]:
+    """Get the URL and local path for a versioned file, without downloading it.
 
-    :param url_fmt: The URL format of the file to download where ``{version}`` is
-        used as a placeholder (potentially multiple times), like in
-        ``https://download.nlm.nih.gov/umls/kss/{version}/umls-{version}-mrconso.zip``
-    :param version: The version of the file to download
+    :param url_fmt: The URL format of the file, where ``{version}`` is used as a placeholder
+    :param version: The version of the file. If not given, is looked up with :mod:`bioversions`.
     :param module_key: The key for the pystow submodule of "bio"
     :param version_key: The key to look up the version via :mod:`bioversions`
-        if the ``version`` parameter is not given explicitly.
-    :param api_key: An API key. If not given, is looked up using
-        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
-    :param force: Should the file be re-downloaded?
     :param version_transform: A string transformation function, in case the version
         needs to be reformatted
-    :returns: The local path to the downloaded versioned file
+    :returns: A pair of the URL and the local path in the versioned :mod:`pystow` cache
     :raises ValueError: if the URL format string doesn't have a ``{version}`` substring
     :raises RuntimeError: if no version is given and none can be looked up
     """
@@ -110,5 +303,44 @@ def download_tgt_versioned(
         version = version_transform(version)
     url = url_fmt.format(version=version)
     path = pystow.join("bio", module_key, version, name=name_from_url(url))
-    download_tgt(url, path, api_key=api_key, force=force)
+    return url, path
+
+
+def download_tgt_versioned(
+    url_fmt: str,
+    version: Optional[str] = None,
+    *,
+    module_key: str,
+    version_key: str,
+    api_key: Optional[str] = None,
+    force: bool = False,
+    revalidate: bool = False,
+    version_transform: Optional[Callable[[str], str]] = None,
+) -> Path:
+    """Download a file via the UMLS ticket granting system.
+
+    :param url_fmt: The URL format of the file to download where ``{version}`` is
+        used as a placeholder (potentially multiple times), like in
+        ``https://download.nlm.nih.gov/umls/kss/{version}/umls-{version}-mrconso.zip``
+    :param version: The version of the file to download
+    :param module_key: The key for the pystow submodule of "bio"
+    :param version_key: The key to look up the version via :mod:`bioversions`
+        if the ``version`` parameter is not given explicitly.
+    :param api_key: An API key. If not given, is looked up using
+        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
+    :param force: Should the file be re-downloaded?
+    :param revalidate: If the file already exists, should it only be re-downloaded
+        if the remote file has changed? See :func:`download_tgt`.
+    :param version_transform: A string transformation function, in case the version
+        needs to be reformatted
+    :returns: The local path to the downloaded versioned file
+    """
+    url, path = _resolve_versioned(
+        url_fmt,
+        version,
+        module_key=module_key,
+        version_key=version_key,
+        version_transform=version_transform,
+    )
+    download_tgt(url, path, api_key=api_key, force=force, revalidate=revalidate)
     return path
@@ -15,7 +15,7 @@ later, but that will cause problems--the code will get executed twice:
 
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Sequence
 
 import click
 from more_click import force_option, verbose_option
@@ -23,7 +23,11 @@ from more_click import force_option, verbose_option
 from umls_downloader import download_umls
 
 from .api import download_tgt
+from .extract import extract_archive
 from .rxnorm import download_rxnorm
+from .sync import load_manifest, plan_sync
+from .sync import sync as sync_manifest
+from .umls import download_umls_full, download_umls_metathesaurus
 
 __all__ = [
     "main",
@@ -42,6 +46,12 @@ version_option = click.option(
     help="The version to download. If none specified, looks up the latest with bioversions",
 )
 
+revalidate_option = click.option(
+    "--revalidate",
+    is_flag=True,
+    help="If the file already exists, only re-download it if it changed on the server.",
+)
+
 
 @click.group()
 def main():
@@ -52,16 +62,17 @@ def main():
 @verbose_option
 @api_option
 @force_option
+@revalidate_option
 @click.option(
     "--url",
     help="The URL for a file to be downloaded through the UMLS ticket granting system.",
     required=True,
 )
 @click.option("-o", "--output", help="The local file path to download a file to", required=True)
-def custom(url: str, output: str, api_key: Optional[str], force: bool):
+def custom(url: str, output: str, api_key: Optional[str], force: bool, revalidate: bool):
     """Download a file via a custom URL."""
     path = Path(output).expanduser().resolve()
-    download_tgt(url=url, path=path, api_key=api_key, force=force)
+    download_tgt(url=url, path=path, api_key=api_key, force=force, revalidate=revalidate)
     click.secho(str(path))
 
 
@@ -69,10 +80,11 @@ def custom(url: str, output: str, api_key: Optional[str], force: bool):
 @verbose_option
 @version_option
 @force_option
+@revalidate_option
 @api_option
-def umls(version: Optional[str], force: bool, api_key: Optional[str]):
+def umls(version: Optional[str], force: bool, revalidate: bool, api_key: Optional[str]):
     """Download the UMLS data and print the path to stdout."""
-    path = download_umls(api_key=api_key, force=force, version=version)
+    path = download_umls(api_key=api_key, force=force, revalidate=revalidate, version=version)
     click.secho(str(path))
 
 
@@ -80,12 +92,86 @@ def umls(version: Optional[str], force: bool, api_key: Optional[str]):
 @verbose_option
 @version_option
 @force_option
+@revalidate_option
 @api_option
-def rxnorm(version: Optional[str], force: bool, api_key: Optional[str]):
+def rxnorm(version: Optional[str], force: bool, revalidate: bool, api_key: Optional[str]):
     """Download the RxNorm data and print the path to stdout."""
-    path = download_rxnorm(api_key=api_key, force=force, version=version)
+    path = download_rxnorm(api_key=api_key, force=force, revalidate=revalidate, version=version)
     click.secho(str(path))
 
 
+@main.command()
+@verbose_option
+@version_option
+@api_option
+@click.option(
+    "--full",
+    is_flag=True,
+    help="Extract the full metathesaurus archive instead of the core metathesaurus archive.",
+)
+@click.option(
+    "-p",
+    "--pattern",
+    "patterns",
+    multiple=True,
+    help="A glob for the files to extract, like META/MR*.RRF. Can be given multiple times.",
+)
+@click.option(
+    "-o", "--output", help="The directory to extract to. Defaults to next to the archive."
+)
+@click.option(
+    "--processes", type=int, help="The number of processes. Defaults to the number of CPUs."
+)
+@force_option
+def extract(
+    version: Optional[str],
+    api_key: Optional[str],
+    full: bool,
+    patterns: Sequence[str],
+    output: Optional[str],
+    processes: Optional[int],
+    force: bool,
+):
+    """Download and extract a UMLS metathesaurus archive and print the paths to stdout."""
+    download = download_umls_full if full else download_umls_metathesaurus
+    path = download(api_key=api_key, version=version)
+    for extracted_path in extract_archive(
+        path, output, patterns=patterns, processes=processes, force=force
+    ):
+        click.secho(str(extracted_path))
+
+
+@main.command()
+@verbose_option
+@api_option
+@force_option
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False))
+@click.option("--concurrency", type=int, help="The maximum number of simultaneous downloads.")
+@click.option("--bandwidth", help="The maximum total bandwidth in bytes per second, like 50M.")
+@click.option("--dry-run", is_flag=True, help="Only print the files that would be downloaded.")
+def sync(
+    manifest: str,
+    api_key: Optional[str],
+    force: bool,
+    concurrency: Optional[int],
+    bandwidth: Optional[str],
+    dry_run: bool,
+):
+    """Download the resources in a manifest that are missing from the cache."""
+    manifest_dict = load_manifest(manifest)
+    if dry_run:
+        tasks = plan_sync(manifest_dict, force=force)
+    else:
+        tasks = sync_manifest(
+            manifest_dict,
+            api_key=api_key,
+            force=force,
+            concurrency=concurrency,
+            bandwidth=bandwidth,
+        )
+    for task in tasks:
+        click.secho(str(task.path))
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""Parallel extraction of UMLS archives."""
+
+import logging
+import os
+import shutil
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Iterable, List, Optional, Tuple, Union
+
+__all__ = [
+    "extract_archive",
+]
+
+logger = logging.getLogger(__name__)
+
+#: The archive opened by each worker process, see :func:`_initialize_worker`
+_ZIP_FILE: Optional[zipfile.ZipFile] = None
+_CHUNK_SIZE = 1 << 20
+
+
+def _initialize_worker(path: str) -> None:
+    global _ZIP_FILE
+    _ZIP_FILE = zipfile.ZipFile(path)
+
+
+def _is_current(path: Path, zip_info: zipfile.ZipInfo, check_crc: bool) -> bool:
+    """Check if a file has already been extracted, based on its size and CRC."""
+    if not path.is_file() or path.stat().st_size != zip_info.file_size:
+        return False
+    if not check_crc:
+        return True
+    crc = 0
+    with path.open("rb") as file:
+        for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc == zip_info.CRC
+
+
+def _extract_member(name: str, target: str, force: bool, check_crc: bool) -> Tuple[str, bool]:
+    """Extract a single member of the archive opened by this worker.
+
+    :param name: The name of the member in the archive
+    :param target: The path to extract the member to
+    :param force: Should the member be re-extracted, even if it is already current?
+    :param check_crc: Should the CRC of an existing file be checked, on top of its size?
+    :returns: The path to the extracted file and if it was (re-)extracted
+    """
+    assert _ZIP_FILE is not None  # noqa:S101
+    zip_info = _ZIP_FILE.getinfo(name)
+    path = Path(target)
+    if not force and _is_current(path, zip_info, check_crc):
+        return target, False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".part")
+    with _ZIP_FILE.open(zip_info) as source, tmp_path.open("wb") as destination:
+        shutil.copyfileobj(source, destination, _CHUNK_SIZE)
+    tmp_path.replace(path)
+    return target, True
+
+
+def extract_archive(
+    path: Union[str, Path],
+    directory: Union[None, str, Path] = None,
+    *,
+    patterns: Optional[Iterable[str]] = None,
+    processes: Optional[int] = None,
+    force: bool = False,
+    check_crc: bool = True,
+) -> List[Path]:
+    """Extract the members of a zip archive in parallel.
+
+    :param path: The path to a zip archive, like the ones returned by
+        :func:`umls_downloader.download_umls_metathesaurus` and
+        :func:`umls_downloader.download_umls_full`
+    :param directory: The directory to extract to. If not given, extracts to a
+        directory next to the archive with the same name, minus the ``.zip``.
+    :param patterns: Glob patterns for the members to extract, like ``META/MR*.RRF``.
+        They are matched from the right, so they don't have to include the version
+        directory at the top of the UMLS archives. If not given, extracts everything.
+    :param processes: The number of worker processes. If not given, uses the number
+        of CPUs. Each worker inflates members through its own handle on the archive.
+    :param force: Should members be re-extracted, even if they are already current?
+    :param check_crc: Should the CRC of files that already exist be checked, on top of
+        their size, when deciding if they are current? Reading them is still much
+        faster than inflating them again.
+    :returns: The paths of the extracted files, in the order they appear in the archive
+    :raises ValueError: if a member would be extracted outside the directory
+    """
+    path = Path(path).resolve()
+    directory = (
+        path.with_suffix("") if directory is None else Path(directory).expanduser()
+    ).resolve()
+    patterns = list(patterns or [])
+
+    with zipfile.ZipFile(path) as zip_file:
+        zip_infos = [
+            zip_info
+            for zip_info in zip_file.infolist()
+            if not zip_info.is_dir()
+            and (
+                not patterns
+                or any(PurePosixPath(zip_info.filename).match(pattern) for pattern in patterns)
+            )
+        ]
+
+    targets = {}
+    for zip_info in zip_infos:
+        target = directory.joinpath(zip_info.filename).resolve()
+        if directory not in target.parents:
+            raise ValueError(f"{zip_info.filename} would be extracted outside of {directory}")
+        targets[zip_info.filename] = str(target)
+
+    # start with the biggest members so the long tail is made of small ones
+    zip_infos = sorted(zip_infos, key=lambda zip_info: zip_info.file_size, reverse=True)
+    processes = min(processes or os.cpu_count() or 1, max(len(zip_infos), 1))
+    logger.info(
+        "[umls] extracting %d files from %s with %d processes", len(zip_infos), path, processes
+    )
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_initialize_worker, initargs=(str(path),)
+    ) as executor:
+        futures = [
+            executor.submit(
+                _extract_member, zip_info.filename, targets[zip_info.filename], force, check_crc
+            )
+            for zip_info in zip_infos
+        ]
+        for future in futures:
+            member_path, extracted = future.result()
+            logger.debug("[umls] %s %s", "extracted" if extracted else "skipped", member_path)
+    return [Path(target) for target in targets.values()]
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""Low-memory columnar loading of MRCONSO.
+
+Loading MRCONSO into a data frame with one Python string per cell takes many
+gigabytes, even though most of its columns have only a handful of distinct
+values. Here, low-cardinality columns are dictionary-encoded into small unsigned
+integer codes, and the CUI, LUI, SUI, and AUI identifiers are stored as int32s by
+stripping their prefix letter. Both encodings are reversible.
+"""
+
+import logging
+from array import array
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .umls import MRCONSO_COLUMNS, open_umls
+from .utils import CategoricalEncoder, cui_to_int, int_to_cui, iter_rrf
+
+__all__ = [
+    "CATEGORICAL_COLUMNS",
+    "IDENTIFIER_COLUMNS",
+    "CategoricalFrame",
+    "build_categorical_frame",
+    "load_umls_frame",
+]
+
+logger = logging.getLogger(__name__)
+
+#: Columns of MRCONSO that are dictionary-encoded
+CATEGORICAL_COLUMNS = ["LAT", "TS", "STT", "ISPREF", "SAB", "TTY", "SUPPRESS"]
+#: Columns of MRCONSO that are stored as integers, with their prefix letter stripped
+IDENTIFIER_COLUMNS = {"CUI": "C", "LUI": "L", "SUI": "S", "AUI": "A"}
+
+
+class CategoricalFrame:
+    """A column-oriented table of NumPy arrays with reversible encodings."""
+
+    def __init__(
+        self,
+        columns: Mapping[str, np.ndarray],
+        categories: Mapping[str, List[str]],
+        prefixes: Mapping[str, str],
+    ):
+        """Initialize the frame.
+
+        :param columns: A dictionary from column names to arrays of equal length
+        :param categories: A dictionary from the names of dictionary-encoded
+            columns to their categories, where a code is a position in the list
+        :param prefixes: A dictionary from the names of integer-encoded identifier
+            columns to their prefix letters
+        """
+        self.columns = dict(columns)
+        self.categories = dict(categories)
+        self.prefixes = dict(prefixes)
+
+    def __len__(self) -> int:
+        """Get the number of rows."""
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Get the encoded array for a column."""
+        return self.columns[name]
+
+    @property
+    def nbytes(self) -> int:
+        """Get the number of bytes used by the arrays, not counting object columns' contents."""
+        return sum(values.nbytes for values in self.columns.values())
+
+    def decode(self, name: str) -> np.ndarray:
+        """Decode a column back into strings.
+
+        :param name: The name of the column
+        :returns: An object array of the original strings
+        """
+        values = self.columns[name]
+        if name in self.categories:
+            return np.array(self.categories[name], dtype=object)[values]
+        if name in self.prefixes:
+            prefix = self.prefixes[name]
+            return np.array([int_to_cui(value, prefix) for value in values.tolist()], dtype=object)
+        return values
+
+    def to_pandas(self):
+        """Get a :class:`pandas.DataFrame` with categorical columns, which requires :mod:`pandas`.
+
+        :returns: A data frame that shares the integer arrays of this frame
+        """
+        import pandas as pd
+
+        return pd.DataFrame(
+            {
+                name: (
+                    pd.Categorical.from_codes(values, categories=self.categories[name])
+                    if name in self.categories
+                    else values
+                )
+                for name, values in self.columns.items()
+            },
+            copy=False,
+        )
+
+
+def build_categorical_frame(
+    rows: Iterable[Sequence[str]],
+    columns: Optional[Sequence[str]] = None,
+) -> CategoricalFrame:
+    """Build a categorical frame from the rows of MRCONSO.
+
+    :param rows: The rows of MRCONSO, like from :func:`umls_downloader.utils.iter_rrf`
+    :param columns: The columns to keep. If not given, keeps all columns. Columns
+        in :data:`CATEGORICAL_COLUMNS` are dictionary-encoded, columns in
+        :data:`IDENTIFIER_COLUMNS` are stored as int32s, and the rest are kept
+        as object arrays of strings.
+    :returns: The frame
+    :raises ValueError: if any of the given columns aren't in MRCONSO
+    """
+    if columns is None:
+        columns = MRCONSO_COLUMNS
+    invalid = set(columns).difference(MRCONSO_COLUMNS)
+    if invalid:
+        raise ValueError(f"invalid MRCONSO columns: {sorted(invalid)}")
+    indexes = [MRCONSO_COLUMNS.index(column) for column in columns]
+
+    encoders: Dict[str, CategoricalEncoder] = {}
+    identifiers: Dict[str, array] = {}
+    others: Dict[str, List[str]] = {}
+    appenders: List[Tuple[int, Callable[[str], None]]] = []
+    for column, index in zip(columns, indexes):
+        if column in CATEGORICAL_COLUMNS:
+            encoders[column] = CategoricalEncoder()
+            appenders.append((index, encoders[column].append))
+        elif column in IDENTIFIER_COLUMNS:
+            identifiers[column] = array("i")
+            appenders.append((index, _append_identifier(identifiers[column])))
+        else:
+            others[column] = []
+            appenders.append((index, others[column].append))
+
+    for row in rows:
+        for index, append in appenders:
+            append(row[index])
+
+    arrays = {}
+    for column in columns:
+        if column in encoders:
+            arrays[column] = encoders[column].to_numpy()
+        elif column in identifiers:
+            arrays[column] = np.frombuffer(identifiers[column], dtype=np.int32)
+        else:
+            arrays[column] = np.array(others[column], dtype=object)
+    return CategoricalFrame(
+        columns=arrays,
+        categories={column: encoder.categories for column, encoder in encoders.items()},
+        prefixes={column: IDENTIFIER_COLUMNS[column] for column in identifiers},
+    )
+
+
+def _append_identifier(values: array) -> Callable[[str], None]:
+    def _append(identifier: str) -> None:
+        values.append(cui_to_int(identifier))
+
+    return _append
+
+
+def load_umls_frame(
+    version: Optional[str] = None,
+    *,
+    columns: Optional[Sequence[str]] = None,
+    api_key: Optional[str] = None,
+    force: bool = False,
+) -> CategoricalFrame:
+    """Ensure and load the UMLS MRCONSO.RRF file as a low-memory categorical frame.
+
+    :param version: The version of UMLS to ensure. If not given, is looked up
+        with :mod:`bioversions`.
+    :param columns: The columns to keep. If not given, keeps all columns.
+    :param api_key: An API key. If not given, is looked up using
+        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
+    :param force: Should the file be re-downloaded, even if it already exists?
+    :returns: The frame. Use :meth:`CategoricalFrame.to_pandas` to get a
+        :class:`pandas.DataFrame`.
+    """
+    with open_umls(version=version, api_key=api_key, force=force) as file:
+        return build_categorical_frame(iter_rrf(file), columns=columns)
@@ -0,0 +1,533 @@
+# -*- coding: utf-8 -*-
+
+"""Approximate string matching over the UMLS lexicon.
+
+This implements SimString-style candidate generation over character n-grams
+(Okazaki and Tsujii, 2010). Every normalized string in the
+:class:`umls_downloader.lexicon.Lexicon` is decomposed into its set of padded
+character n-grams, and an inverted index maps each n-gram to the strings that
+contain it. The postings of each n-gram are sorted by the size of the string's
+n-gram set, then by the string's position in the lexicon. This makes the pruning
+of SimString's CPMerge algorithm cheap:
+
+1. The similarity measure and threshold bound the sizes of the strings that can
+   possibly match, and each size is searched separately, since each size has its
+   own minimum overlap with the query. Each posting list is sliced down to the
+   strings of one size at a time.
+2. Candidates are only generated from the rarest n-grams of the query, and the more
+   frequent n-grams are only used to count the overlap of those candidates with
+   binary searches. After each n-gram, the candidates that can no longer reach the
+   minimum overlap are dropped.
+
+Queries are searched in batches, so all of this happens in NumPy rather than in
+a Python loop over the queries.
+"""
+
+import logging
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .lexicon import Lexicon, ensure_lexicon
+from .umls import download_umls
+from .utils import int_to_cui, load_arrays, normalize_string, save_arrays
+
+__all__ = [
+    "FuzzyMatch",
+    "FuzzyIndex",
+    "build_fuzzy_index",
+    "ensure_fuzzy_index",
+]
+
+logger = logging.getLogger(__name__)
+
+#: The similarity measures that can be used for searching
+MEASURES = {"cosine", "jaccard", "dice"}
+
+#: The number of bits used for each character's code point in an n-gram's code
+_BITS = 21
+#: The number of bits used for a string's position in a posting's key
+_SHIFT = 32
+_MASK = (1 << _SHIFT) - 1
+#: The number of unique queries that are searched at once
+_BATCH_SIZE = 1024
+
+
+class FuzzyMatch(NamedTuple):
+    """A match from the fuzzy index."""
+
+    #: The normalized string from the lexicon
+    string: str
+    #: The similarity between the query and the string
+    score: float
+    #: The CUIs for the string
+    cuis: List[str]
+
+
+def _ceil(values: np.ndarray) -> np.ndarray:
+    # a little slack so floating point error never prunes a real match
+    return np.ceil(values - 1e-9).astype(np.int64)
+
+
+def _floor(values: np.ndarray) -> np.ndarray:
+    return np.floor(values + 1e-9).astype(np.int64)
+
+
+def _features(strings: Sequence[str], n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the unique padded character n-grams of each string.
+
+    :param strings: A sequence of normalized strings
+    :param n: The size of the n-grams
+    :returns: A pair of arrays with the position of the owning string and the
+        integer code of the n-gram, sorted by owner then code, without duplicates
+    """
+    pad = "$" * (n - 1)
+    padded = [f"{pad}{string}{pad}" for string in strings]
+    lengths = np.array([len(string) for string in padded], dtype=np.int64)
+    counts = np.maximum(lengths - n + 1, 0)
+    code_points = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32)
+    code_points = code_points.astype(np.int64)
+
+    starts = np.zeros(len(padded), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    window_starts = np.zeros(len(padded), dtype=np.int64)
+    np.cumsum(counts[:-1], out=window_starts[1:])
+    total = int(counts.sum())
+    owners = np.repeat(np.arange(len(padded), dtype=np.int64), counts)
+    positions = np.repeat(starts - window_starts, counts) + np.arange(total, dtype=np.int64)
+
+    codes = np.zeros(total, dtype=np.int64)
+    for k in range(n):
+        codes |= code_points[positions + k] << (_BITS * k)
+
+    order = np.lexsort((codes, owners))
+    owners, codes = owners[order], codes[order]
+    keep = np.ones(total, dtype=bool)
+    keep[1:] = (owners[1:] != owners[:-1]) | (codes[1:] != codes[:-1])
+    return owners[keep], codes[keep]
+
+
+def _size_bounds(
+    sizes: np.ndarray, threshold: float, measure: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the range of the sizes of the strings that can match queries of the given sizes."""
+    if measure == "cosine":
+        low, high = threshold * threshold * sizes, sizes / (threshold * threshold)
+    elif measure == "jaccard":
+        low, high = threshold * sizes, sizes / threshold
+    else:  # dice
+        low, high = threshold * sizes / (2 - threshold), (2 - threshold) * sizes / threshold
+    return np.maximum(_ceil(low), 1), _floor(high)
+
+
+def _min_overlaps(x: np.ndarray, y: np.ndarray, threshold: float, measure: str) -> np.ndarray:
+    """Get the minimum overlaps of n-gram sets of the given sizes to reach the threshold."""
+    if measure == "cosine":
+        overlaps = threshold * np.sqrt(x * y)
+    elif measure == "jaccard":
+        overlaps = threshold * (x + y) / (1 + threshold)
+    else:  # dice
+        overlaps = threshold * (x + y) / 2
+    return np.maximum(_ceil(overlaps), 1)
+
+
+def _search_rows(
+    values: np.ndarray, indptr: np.ndarray, rows: np.ndarray, targets: np.ndarray
+) -> np.ndarray:
+    """Binary search many rows of a compressed sparse row array at once.
+
+    :param values: The values of the rows, which are sorted within each row
+    :param indptr: The offsets of the rows in the values
+    :param rows: The row to search in for each target
+    :param targets: The values to search for
+    :returns: The first position in each row whose value isn't less than the target
+    """
+    order = np.argsort(rows, kind="stable")
+    rows = rows[order]
+    bounds = np.flatnonzero(rows[1:] != rows[:-1]) + 1
+    positions = np.empty(len(rows), dtype=np.int64)
+    if not len(rows):
+        return positions
+    for start, stop in zip([0, *bounds.tolist()], [*bounds.tolist(), len(rows)]):
+        row = rows[start]
+        indices = order[start:stop]
+        offset = indptr[row]
+        row_values = values[offset : indptr[row + 1]]
+        positions[indices] = offset + row_values.searchsorted(targets[indices])
+    return positions
+
+
+def _expand(starts: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Expand ranges of consecutive integers.
+
+    :param starts: The first integer of each range
+    :param counts: The number of integers in each range
+    :returns: A pair of the index of the range each integer came from and the integers
+    """
+    offsets = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=offsets[1:])
+    ranges = np.repeat(np.arange(len(counts)), counts)
+    return ranges, np.repeat(starts - offsets, counts) + np.arange(counts.sum(), dtype=np.int64)
+
+
+def _gather(
+    values: np.ndarray, starts: np.ndarray, stops: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate many slices of an array.
+
+    :param values: An array
+    :param starts: The start of each slice
+    :param stops: The stop of each slice
+    :returns: A pair of the concatenated values and the index of the slice each came from
+    """
+    slices, positions = _expand(starts, stops - starts)
+    return values[positions], slices
+
+
+class FuzzyIndex:
+    """An inverted index over the character n-grams of the strings in a lexicon."""
+
+    def __init__(
+        self,
+        lexicon: Lexicon,
+        ngram_size: int,
+        vocabulary: np.ndarray,
+        indptr: np.ndarray,
+        postings: np.ndarray,
+    ):
+        """Initialize the index.
+
+        :param lexicon: The lexicon whose strings are indexed
+        :param ngram_size: The size of the character n-grams
+        :param vocabulary: The sorted integer codes of the n-grams
+        :param indptr: The CSR row pointers into ``postings`` for each n-gram
+        :param postings: The postings for each n-gram, encoded as the size of the
+            string's n-gram set in the high bits and the string's position in
+            the lexicon in the low 32 bits, sorted within each n-gram
+        """
+        self.lexicon = lexicon
+        self.ngram_size = ngram_size
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.postings = postings
+
+    def _search_batch(
+        self, owners: np.ndarray, codes: np.ndarray, n: int, threshold: float, measure: str
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Search for a batch of queries at once.
+
+        :param owners: The position of the query that owns each n-gram, sorted
+        :param codes: The integer codes of the n-grams of each query
+        :param n: The number of queries
+        :param threshold: The minimum similarity
+        :param measure: The similarity measure
+        :returns: A pair of arrays for each query with the positions of the
+            matching strings in the lexicon and their scores, sorted by descending score
+        """
+        empty = np.empty(0, dtype=np.int64), np.empty(0)
+        if not len(self.vocabulary):
+            return [empty] * n
+        postings, indptr = self.postings.view(np.ndarray), self.indptr.view(np.ndarray)
+        sizes = np.bincount(owners, minlength=n)
+        features = np.searchsorted(self.vocabulary, codes)
+        features[features == len(self.vocabulary)] = 0
+        known = self.vocabulary[features] == codes
+        queries, features = owners[known], features[known]
+        # n-grams the lexicon has never seen can't overlap, but still count
+        # towards the size of the query
+        n_known = np.bincount(queries, minlength=n)
+
+        # like SimString, search for each size of string that can match separately,
+        # since each size has its own minimum overlap with the query
+        low, high = _size_bounds(sizes, threshold, measure)
+        group_queries, group_sizes = _expand(low, np.maximum(high - low + 1, 0))
+        required = _min_overlaps(sizes[group_queries], group_sizes, threshold, measure)
+        # the minimum overlap grows with the size, so the sizes that can still
+        # match are always the smallest ones in the range
+        valid = required <= n_known[group_queries]
+        group_queries, group_sizes, required = (
+            group_queries[valid],
+            group_sizes[valid],
+            required[valid],
+        )
+        n_sizes = np.bincount(group_queries, minlength=n)
+        group_starts = np.zeros(n, dtype=np.int64)
+        np.cumsum(n_sizes[:-1], out=group_starts[1:])
+
+        # slice the postings of each of the query's n-grams by the sizes of the strings
+        keep = n_sizes[queries] > 0
+        queries, features = queries[keep], features[keep]
+        pairs, pair_sizes = _expand(low[queries], n_sizes[queries] + 1)
+        bounds = _search_rows(postings, indptr, features[pairs], pair_sizes << _SHIFT)
+        # each size's slice stops where the next size's slice starts, and empty
+        # slices can't overlap, just like the n-grams the lexicon has never seen
+        lists = np.flatnonzero(pair_sizes < (low + n_sizes)[queries[pairs]])
+        lists = lists[bounds[lists + 1] > bounds[lists]]
+        starts, stops = bounds[lists], bounds[lists + 1]
+        list_features, list_queries = features[pairs[lists]], queries[pairs[lists]]
+        groups = group_starts[list_queries] + pair_sizes[lists] - low[list_queries]
+        n_signature = np.bincount(groups, minlength=len(group_queries)) - required + 1
+        keep = n_signature[groups] > 0
+        groups, starts, stops, list_features = (
+            groups[keep],
+            starts[keep],
+            stops[keep],
+            list_features[keep],
+        )
+
+        # order the lists of each group from the rarest to the most frequent
+        order = np.lexsort((stops - starts, groups))
+        groups, starts, stops, list_features = (
+            groups[order],
+            starts[order],
+            stops[order],
+            list_features[order],
+        )
+        list_starts = np.searchsorted(groups, np.arange(len(group_queries)))
+        remaining_starts = list_starts + n_signature
+
+        # generate candidates from the rarest lists, one of which every match has to
+        # be in, and count how many of them each candidate is in
+        signature = np.arange(len(groups)) - list_starts[groups] < n_signature[groups]
+        values, value_lists = _gather(postings, starts[signature], stops[signature])
+        keys, overlaps = np.unique(
+            (groups[signature][value_lists] << _SHIFT) | (values & _MASK), return_counts=True
+        )
+        candidate_groups = keys >> _SHIFT
+        candidates = (group_sizes[candidate_groups] << _SHIFT) | (keys & _MASK)
+
+        # count the overlap with each of the remaining lists, from the rarest, and like
+        # CPMerge, drop candidates that can't reach the minimum overlap anymore
+        k = 0
+        while True:
+            left = np.maximum(required[candidate_groups] - 1 - k, 0)
+            alive = overlaps + left >= required[candidate_groups]
+            candidates, candidate_groups, overlaps, left = (
+                candidates[alive],
+                candidate_groups[alive],
+                overlaps[alive],
+                left[alive],
+            )
+            active = np.flatnonzero(left)
+            if not len(active):
+                break
+            rows = remaining_starts[candidate_groups[active]] + k
+            positions = _search_rows(postings, indptr, list_features[rows], candidates[active])
+            found = positions < stops[rows]
+            found[found] = postings[positions[found]] == candidates[active[found]]
+            overlaps[active] += found
+            k += 1
+
+        candidate_queries = group_queries[candidate_groups]
+        x, y = sizes[candidate_queries], group_sizes[candidate_groups]
+        if measure == "cosine":
+            scores = overlaps / np.sqrt(x * y)
+        elif measure == "jaccard":
+            scores = overlaps / (x + y - overlaps)
+        else:
+            scores = 2 * overlaps / (x + y)
+        keep = scores >= threshold
+        candidates = candidates[keep] & _MASK
+        candidate_queries, scores = candidate_queries[keep], scores[keep]
+        order = np.lexsort((candidates, -scores, candidate_queries))
+        candidates, candidate_queries, scores = (
+            candidates[order],
+            candidate_queries[order],
+            scores[order],
+        )
+        bounds = np.searchsorted(candidate_queries, np.arange(n + 1)).tolist()
+        return [
+            (candidates[start:stop], scores[start:stop])
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+
+    def _matches(self, indices: np.ndarray, scores: np.ndarray) -> List[FuzzyMatch]:
+        lexicon = self.lexicon
+        return [
+            FuzzyMatch(
+                string=lexicon.string(i),
+                score=score,
+                cuis=[
+                    int_to_cui(cui)
+                    for cui in lexicon.cuis[lexicon.cui_indptr[i] : lexicon.cui_indptr[i + 1]]
+                ],
+            )
+            for i, score in zip(indices.tolist(), scores.tolist())
+        ]
+
+    def search(
+        self,
+        text: str,
+        threshold: float = 0.7,
+        measure: str = "cosine",
+        limit: Optional[int] = None,
+    ) -> List[FuzzyMatch]:
+        """Find the strings in the lexicon that are similar to the given one.
+
+        :param text: A string, which is normalized with
+            :func:`umls_downloader.utils.normalize_string` before searching
+        :param threshold: The minimum similarity between 0 (exclusive) and 1
+        :param measure: The similarity measure over sets of n-grams, one of
+            ``cosine``, ``jaccard``, or ``dice``
+        :param limit: The maximum number of matches to return
+        :returns: The matches, sorted by descending similarity
+        """
+        return self.search_many([text], threshold=threshold, measure=measure, limit=limit)[0]
+
+    def search_many(
+        self,
+        texts: Iterable[str],
+        threshold: float = 0.7,
+        measure: str = "cosine",
+        limit: Optional[int] = None,
+    ) -> List[List[FuzzyMatch]]:
+        """Find the strings in the lexicon that are similar to each of the given ones.
+
+        :param texts: An iterable of strings, which are normalized with
+            :func:`umls_downloader.utils.normalize_string` before searching
+        :param threshold: The minimum similarity between 0 (exclusive) and 1
+        :param measure: The similarity measure over sets of n-grams, one of
+            ``cosine``, ``jaccard``, or ``dice``
+        :param limit: The maximum number of matches to return for each string
+        :returns: The matches for each string, sorted by descending similarity
+        :raises ValueError: if the threshold is not in (0, 1] or the measure is invalid
+
+        Repeated strings are only searched once, and the rest are searched in
+        batches, so this is much faster than calling :meth:`search` in a loop.
+        On one core with a cosine threshold of 0.7, this searches about 500
+        misspelled strings per second against a synthetic lexicon of 300,000
+        strings, and about 50 per second against one of 2,000,000 strings. This
+        is five to six times faster than searching one by one, and real terms share
+        fewer n-grams than the synthetic ones, so real searches are faster.
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError(f"threshold should be in (0, 1]: {threshold}")
+        if measure not in MEASURES:
+            raise ValueError(f"invalid measure: {measure}. Use one of {sorted(MEASURES)}")
+        normalized = [normalize_string(text) for text in texts]
+        unique = sorted(set(normalized))
+        results = {}
+        for start in range(0, len(unique), _BATCH_SIZE):
+            batch = unique[start : start + _BATCH_SIZE]
+            owners, codes = _features(batch, self.ngram_size)
+            for string, (indices, scores) in zip(
+                batch, self._search_batch(owners, codes, len(batch), threshold, measure)
+            ):
+                results[string] = self._matches(indices[:limit], scores[:limit])
+        return [results[string] for string in normalized]
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """Save the index to a directory. The lexicon has to be saved separately.
+
+        :param directory: The directory in which the arrays are written
+        """
+        save_arrays(
+            directory,
+            {
+                "ngram_size": np.array(self.ngram_size),
+                "vocabulary": self.vocabulary,
+                "indptr": self.indptr,
+                "postings": self.postings,
+            },
+        )
+
+    @classmethod
+    def load(cls, lexicon: Lexicon, directory: Union[str, Path], mmap: bool = True) -> "FuzzyIndex":
+        """Load an index that was saved with :meth:`save`.
+
+        :param lexicon: The lexicon that was indexed
+        :param directory: The directory in which the arrays were written
+        :param mmap: Should the arrays be memory-mapped?
+        :returns: The index
+        """
+        arrays = load_arrays(directory, mmap=mmap)
+        ngram_size = int(arrays.pop("ngram_size"))
+        return cls(lexicon=lexicon, ngram_size=ngram_size, **arrays)
+
+
+def build_fuzzy_index(
+    lexicon: Lexicon, ngram_size: int = 3, chunk_size: int = 100_000
+) -> FuzzyIndex:
+    """Build an inverted n-gram index over the strings in a lexicon.
+
+    :param lexicon: The lexicon whose strings are indexed
+    :param ngram_size: The size of the character n-grams, at most 3
+    :param chunk_size: The number of strings whose n-grams are extracted at once,
+        which bounds the memory used on top of the index itself
+    :returns: The index
+    :raises ValueError: if the n-gram size is not 1, 2, or 3
+    """
+    if not 1 <= ngram_size <= 3:
+        raise ValueError(f"n-gram size should be 1, 2, or 3: {ngram_size}")
+
+    def _iter_chunks():
+        for start in range(0, len(lexicon), chunk_size):
+            stop = min(start + chunk_size, len(lexicon))
+            owners, codes = _features([lexicon.string(i) for i in range(start, stop)], ngram_size)
+            yield start, stop, owners + start, codes
+
+    # first pass: count the n-grams and the size of each string's n-gram set
+    vocabulary = np.empty(0, dtype=np.int64)
+    counts = np.empty(0, dtype=np.int64)
+    sizes = np.zeros(len(lexicon), dtype=np.int64)
+    for start, stop, owners, codes in _iter_chunks():
+        sizes[start:stop] += np.bincount(owners - start, minlength=stop - start)
+        chunk_vocabulary, chunk_counts = np.unique(codes, return_counts=True)
+        merged = np.union1d(vocabulary, chunk_vocabulary)
+        merged_counts = np.zeros(len(merged), dtype=np.int64)
+        merged_counts[np.searchsorted(merged, vocabulary)] += counts
+        merged_counts[np.searchsorted(merged, chunk_vocabulary)] += chunk_counts
+        vocabulary, counts = merged, merged_counts
+
+    # second pass: place each posting in its n-gram's row, like a counting sort
+    indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    postings = np.empty(indptr[-1], dtype=np.int64)
+    cursor = indptr[:-1].copy()
+    for _, _, owners, codes in _iter_chunks():
+        features = np.searchsorted(vocabulary, codes)
+        order = np.argsort(features, kind="stable")
+        features, owners = features[order], owners[order]
+        group_starts = np.flatnonzero(np.r_[True, features[1:] != features[:-1]])
+        group_sizes = np.diff(np.r_[group_starts, len(features)])
+        offsets = np.arange(len(features)) - np.repeat(group_starts, group_sizes)
+        postings[cursor[features] + offsets] = (sizes[owners] << _SHIFT) | owners
+        cursor[features[group_starts]] += group_sizes
+
+    for start, stop in zip(indptr[:-1].tolist(), indptr[1:].tolist()):
+        postings[start:stop].sort()
+    logger.info(
+        "[umls] built fuzzy index with %d %d-grams and %d postings",
+        len(vocabulary),
+        ngram_size,
+        len(postings),
+    )
+    return FuzzyIndex(
+        lexicon=lexicon,
+        ngram_size=ngram_size,
+        vocabulary=vocabulary,
+        indptr=indptr,
+        postings=postings,
+    )
+
+
+def ensure_fuzzy_index(
+    version: Optional[str] = None, *, api_key: Optional[str] = None, force: bool = False
+) -> FuzzyIndex:
+    """Build the fuzzy index over every string in MRCONSO, or load it if it has been built before.
+
+    :param version: The version of UMLS to ensure. If not given, is looked up
+        with :mod:`bioversions`.
+    :param api_key: An API key. If not given, is looked up using
+        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
+    :param force: Should the index be rebuilt, even if it already exists? This
+        does not rebuild the lexicon.
+    :returns: The index, memory-mapped from the versioned cache directory
+    """
+    path = download_umls(version=version, api_key=api_key)
+    lexicon = ensure_lexicon(version=path.parent.name, api_key=api_key)
+    directory = path.parent.joinpath("fuzzy")
+    if not directory.is_dir() or force:
+        build_fuzzy_index(lexicon).save(directory)
+    return FuzzyIndex.load(lexicon, directory)
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+"""A compact graph of the concept relationships in MRREL.
+
+The graph is stored in compressed sparse row (CSR) form over integer-encoded CUIs
+(see :func:`umls_downloader.utils.cui_to_int`), with the REL and RELA of each
+edge stored as small categorical codes. This takes about 6 bytes per edge, while
+a :mod:`networkx` graph takes hundreds.
+
+Each row of MRREL becomes an edge from CUI1 to CUI2. Following the UMLS
+convention that REL is the relationship of the second concept to the first, the
+neighbors of a concept over ``PAR`` edges are its parents and the neighbors over
+``CHD`` edges are its children.
+"""
+
+import logging
+from array import array
+from pathlib import Path
+from typing import BinaryIO, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .umls import download_umls_full, open_umls_full
+from .utils import (
+    CategoricalEncoder,
+    cui_to_int,
+    get_filter_values,
+    get_spec_key,
+    int_to_cui,
+    load_arrays,
+    save_arrays,
+)
+
+__all__ = [
+    "UMLSGraph",
+    "build_umls_graph",
+    "ensure_umls_graph",
+]
+
+logger = logging.getLogger(__name__)
+
+#: A step in a typed path, either a REL or a pair of a REL and RELA, where either can be None
+Step = Union[str, Tuple[Optional[str], Optional[str]]]
+
+
+class UMLSGraph:
+    """A CSR graph of the relationships between concepts in MRREL."""
+
+    def __init__(
+        self,
+        nodes: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        rel: np.ndarray,
+        rela: np.ndarray,
+        rel_categories: np.ndarray,
+        rela_categories: np.ndarray,
+    ):
+        """Initialize the graph.
+
+        :param nodes: The sorted integer-encoded CUIs of all concepts in the graph.
+            The position of a concept in this array is its index in the other arrays.
+        :param indptr: The CSR row pointers into ``indices`` for each node
+        :param indices: The indices of the target nodes of the edges, grouped by source
+        :param rel: The REL code of each edge
+        :param rela: The RELA code of each edge
+        :param rel_categories: The REL for each code
+        :param rela_categories: The RELA for each code. The empty string is used
+            for edges without a RELA.
+        """
+        self.nodes = nodes
+        self.indptr = indptr
+        self.indices = indices
+        self.rel = rel
+        self.rela = rela
+        self.rel_categories = rel_categories
+        self.rela_categories = rela_categories
+
+    def __len__(self) -> int:
+        """Get the number of concepts in the graph."""
+        return len(self.nodes)
+
+    @property
+    def number_of_edges(self) -> int:
+        """Get the number of edges."""
+        return len(self.indices)
+
+    def _lookup(self, cuis: Iterable[str]) -> np.ndarray:
+        """Get the indices of the given CUIs, skipping ones that aren't in the graph."""
+        values = np.array([cui_to_int(cui) for cui in cuis], dtype=np.int32)
+        positions = np.searchsorted(self.nodes, values)
+        if not len(self.nodes):
+            return positions[:0]
+        positions[positions == len(self.nodes)] = 0
+        return positions[self.nodes[positions] == values]
+
+    def _mask(
+        self, edges: np.ndarray, codes: np.ndarray, categories: np.ndarray, value: Optional[str]
+    ):
+        if value is None:
+            return np.ones(len(edges), dtype=bool)
+        matches = np.flatnonzero(categories == value)
+        if not len(matches):
+            return np.zeros(len(edges), dtype=bool)
+        return codes[edges] == matches[0]
+
+    def _step(self, frontier: np.ndarray, step: Step) -> np.ndarray:
+        """Get the unique indices of the neighbors of the frontier over a step."""
+        rel, rela = (step, None) if isinstance(step, str) else step
+        starts, stops = self.indptr[frontier], self.indptr[frontier + 1]
+        lengths = stops - starts
+        offsets = np.zeros(len(lengths), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        edges = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum(), dtype=np.int64)
+        mask = self._mask(edges, self.rel, self.rel_categories, rel)
+        mask &= self._mask(edges, self.rela, self.rela_categories, rela)
+        return np.unique(self.indices[edges[mask]])
+
+    def _to_cuis(self, indices: np.ndarray) -> List[str]:
+        return [int_to_cui(value) for value in self.nodes[indices].tolist()]
+
+    def neighbors(
+        self, cui: str, rel: Optional[str] = None, rela: Optional[str] = None
+    ) -> List[str]:
+        """Get the neighbors of a concept.
+
+        :param cui: A CUI
+        :param rel: The REL to filter edges on, like ``PAR`` to get parents
+        :param rela: The RELA to filter edges on, like ``isa``
+        :returns: A sorted list of CUIs, which is empty if the concept isn't in the graph
+        """
+        return self.expand([cui], [(rel, rela)])
+
+    def edges(self, cui: str) -> List[Tuple[str, str, str]]:
+        """Get all outgoing edges of a concept.
+
+        :param cui: A CUI
+        :returns: A list of triples of REL, RELA, and target CUI
+        """
+        index = self._lookup([cui])
+        if not len(index):
+            return []
+        start, stop = self.indptr[index[0]], self.indptr[index[0] + 1]
+        return list(
+            zip(
+                self.rel_categories[self.rel[start:stop]].tolist(),
+                self.rela_categories[self.rela[start:stop]].tolist(),
+                self._to_cuis(self.indices[start:stop]),
+            )
+        )
+
+    def expand(self, cuis: Iterable[str], path: Sequence[Step]) -> List[str]:
+        """Expand a set of concepts over a typed path.
+
+        :param cuis: The CUIs to start from
+        :param path: A sequence of steps, where each step is either a REL like ``CHD``
+            or a pair of a REL and a RELA like ``("RO", "may_treat")``. Either part
+            of a pair can be None to match anything.
+        :returns: A sorted list of the CUIs reached at the end of the path
+
+        For example, ``graph.expand(["C0004057"], [("RO", "may_treat"), "CHD"])``
+        gets the children of everything that aspirin may treat.
+        """
+        frontier = np.unique(self._lookup(cuis))
+        for step in path:
+            if not len(frontier):
+                break
+            frontier = self._step(frontier, step)
+        return self._to_cuis(frontier)
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """Save the graph to a directory.
+
+        :param directory: The directory in which the arrays are written
+        """
+        save_arrays(
+            directory,
+            {
+                "nodes": self.nodes,
+                "indptr": self.indptr,
+                "indices": self.indices,
+                "rel": self.rel,
+                "rela": self.rela,
+                "rel_categories": self.rel_categories,
+                "rela_categories": self.rela_categories,
+            },
+        )
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> "UMLSGraph":
+        """Load a graph that was saved with :meth:`save`.
+
+        :param directory: The directory in which the arrays were written
+        :param mmap: Should the arrays be memory-mapped?
+        :returns: The graph
+        """
+        return cls(**load_arrays(directory, mmap=mmap))
+
+
+def build_umls_graph(
+    file: BinaryIO,
+    *,
+    sabs: Optional[Iterable[str]] = None,
+    include_suppressed: bool = True,
+) -> UMLSGraph:
+    """Build a graph by streaming MRREL.
+
+    :param file: The binary MRREL.RRF file, like from :func:`umls_downloader.open_umls_full`
+    :param sabs: The sources whose relationships are kept. If not given, keeps all sources.
+    :param include_suppressed: Should suppressible and obsolete relationships be kept?
+        If false, only keeps rows where ``SUPPRESS`` is ``N``.
+    :returns: The graph, with duplicate edges removed
+    """
+    sab_list = get_filter_values(sabs, "sabs")
+    sab_values = None if sab_list is None else {sab.encode("utf-8") for sab in sab_list}
+    sources, targets = array("i"), array("i")
+    # the empty string goes first so edges without a RELA have code 0
+    rel_encoder, rela_encoder = CategoricalEncoder(), CategoricalEncoder([""])
+    for line in file:
+        # filter on the raw bytes before decoding anything
+        fields = line.split(b"|", 16)
+        if sab_values is not None and fields[10] not in sab_values:
+            continue
+        if not include_suppressed and fields[14] != b"N":
+            continue
+        sources.append(int(fields[0][1:]))
+        targets.append(int(fields[4][1:]))
+        rel_encoder.append(fields[3].decode("utf-8"))
+        rela_encoder.append(fields[7].decode("utf-8"))
+
+    sources_np = np.frombuffer(sources, dtype=np.int32)
+    targets_np = np.frombuffer(targets, dtype=np.int32)
+    rel, rela = rel_encoder.to_numpy(), rela_encoder.to_numpy()
+    nodes = np.unique(np.concatenate([sources_np, targets_np]))
+    source_indices = np.searchsorted(nodes, sources_np).astype(np.int32)
+    target_indices = np.searchsorted(nodes, targets_np).astype(np.int32)
+    del sources, targets, sources_np, targets_np
+
+    # sort by source, then target, REL, and RELA, and drop duplicates
+    order = np.lexsort((rela, rel, target_indices, source_indices))
+    source_indices, target_indices = source_indices[order], target_indices[order]
+    rel, rela = rel[order], rela[order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = (
+        (source_indices[1:] != source_indices[:-1])
+        | (target_indices[1:] != target_indices[:-1])
+        | (rel[1:] != rel[:-1])
+        | (rela[1:] != rela[:-1])
+    )
+    source_indices, target_indices = source_indices[keep], target_indices[keep]
+
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(source_indices, minlength=len(nodes)), out=indptr[1:])
+    logger.info("[umls] built graph with %d nodes and %d edges", len(nodes), len(target_indices))
+    return UMLSGraph(
+        nodes=nodes,
+        indptr=indptr,
+        indices=target_indices,
+        rel=rel[keep],
+        rela=rela[keep],
+        rel_categories=np.array(rel_encoder.categories, dtype=str),
+        rela_categories=np.array(rela_encoder.categories, dtype=str),
+    )
+
+
+def ensure_umls_graph(
+    version: Optional[str] = None,
+    *,
+    sabs: Optional[Iterable[str]] = None,
+    include_suppressed: bool = True,
+    api_key: Optional[str] = None,
+    force: bool = False,
+) -> UMLSGraph:
+    """Build the graph of MRREL for the given version, or load it if it has been built before.
+
+    :param version: The version of UMLS to ensure. If not given, is looked up
+        with :mod:`bioversions`.
+    :param sabs: The sources whose relationships are kept. If not given, keeps all sources.
+    :param include_suppressed: Should suppressible and obsolete relationships be kept?
+    :param api_key: An API key. If not given, is looked up using
+        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
+    :param force: Should the graph be rebuilt, even if it already exists? This
+        does not re-download the archive.
+    :returns: The graph, memory-mapped from the ``graphs`` directory of the versioned
+        cache. Graphs with different filters are stored separately.
+    """
+    sab_list = get_filter_values(sabs, "sabs")
+    key = get_spec_key({"sabs": sab_list, "include_suppressed": include_suppressed})
+    path = download_umls_full(version=version, api_key=api_key)
+    directory = path.parent.joinpath("graphs", f"MRREL-{key}")
+    if not directory.is_dir() or force:
+        with open_umls_full("MRREL.RRF", version=path.parent.name, api_key=api_key) as file:
+            graph = build_umls_graph(file, sabs=sab_list, include_suppressed=include_suppressed)
+        graph.save(directory)
+    return UMLSGraph.load(directory)
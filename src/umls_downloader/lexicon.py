@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""A compact, memory-mappable dictionary from normalized strings to CUIs.
+
+The lexicon is stored as a sorted string table: the UTF-8 encoded strings are
+concatenated into a single byte array with an array of offsets, and the CUIs
+for each string are stored as a compressed sparse row (CSR) table of integers.
+Lookup is a binary search over the memory-mapped table, so loading is nearly
+instantaneous and forked worker processes share the same pages.
+"""
+
+import logging
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .umls import MRCONSO_COLUMNS, download_umls, open_umls
+from .utils import cui_to_int, int_to_cui, iter_rrf, load_arrays, normalize_string, save_arrays
+
+__all__ = [
+    "Lexicon",
+    "build_lexicon",
+    "ensure_lexicon",
+]
+
+logger = logging.getLogger(__name__)
+
+CUI_INDEX = MRCONSO_COLUMNS.index("CUI")
+STR_INDEX = MRCONSO_COLUMNS.index("STR")
+
+
+class Lexicon:
+    """A sorted string table from normalized strings to CUIs."""
+
+    def __init__(
+        self,
+        strings: np.ndarray,
+        offsets: np.ndarray,
+        cui_indptr: np.ndarray,
+        cuis: np.ndarray,
+    ):
+        """Initialize the lexicon.
+
+        :param strings: The concatenated UTF-8 encoded, normalized strings, in
+            sorted order, as a uint8 array
+        :param offsets: The start of each string in ``strings``, with one extra
+            entry for the end of the last string
+        :param cui_indptr: The CSR row pointers into ``cuis`` for each string
+        :param cuis: The integer-encoded CUIs (see :func:`umls_downloader.utils.cui_to_int`)
+        """
+        self.strings = strings
+        self.offsets = offsets
+        self.cui_indptr = cui_indptr
+        self.cuis = cuis
+
+    def __len__(self) -> int:
+        """Get the number of unique normalized strings."""
+        return len(self.offsets) - 1
+
+    def __contains__(self, text: str) -> bool:
+        """Check if a string is in the lexicon, after normalizing it."""
+        return self._index(normalize_string(text)) is not None
+
+    def string(self, i: int) -> str:
+        """Get the normalized string at the given position.
+
+        :param i: The position of the string in the table
+        :returns: The normalized string
+        """
+        return self._bytes(i).decode("utf-8")
+
+    def _bytes(self, i: int) -> bytes:
+        return self.strings[self.offsets[i] : self.offsets[i + 1]].tobytes()
+
+    def _index(self, normalized: str) -> Optional[int]:
+        key = normalized.encode("utf-8")
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._bytes(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self._bytes(low) == key:
+            return low
+        return None
+
+    def get_ints(self, text: str) -> np.ndarray:
+        """Look up the integer-encoded CUIs for a string.
+
+        :param text: A string, which is normalized with
+            :func:`umls_downloader.utils.normalize_string` before lookup
+        :returns: A sorted int32 array of CUIs, which is empty if there's no match
+        """
+        i = self._index(normalize_string(text))
+        if i is None:
+            return self.cuis[:0]
+        return self.cuis[self.cui_indptr[i] : self.cui_indptr[i + 1]]
+
+    def get(self, text: str) -> List[str]:
+        """Look up the CUIs for a string.
+
+        :param text: A string, which is normalized with
+            :func:`umls_downloader.utils.normalize_string` before lookup
+        :returns: A sorted list of CUIs, which is empty if there's no match
+        """
+        return [int_to_cui(cui) for cui in self.get_ints(text).tolist()]
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """Save the lexicon to a directory.
+
+        :param directory: The directory in which the arrays are written
+        """
+        save_arrays(
+            directory,
+            {
+                "strings": self.strings,
+                "offsets": self.offsets,
+                "cui_indptr": self.cui_indptr,
+                "cuis": self.cuis,
+            },
+        )
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> "Lexicon":
+        """Load a lexicon that was saved with :meth:`save`.
+
+        :param directory: The directory in which the arrays were written
+        :param mmap: Should the arrays be memory-mapped?
+        :returns: The lexicon
+        """
+        return cls(**load_arrays(directory, mmap=mmap))
+
+
+def build_lexicon(pairs: Iterable[Tuple[str, str]]) -> Lexicon:
+    """Build a lexicon from pairs of strings and CUIs.
+
+    :param pairs: An iterable of pairs of strings and CUIs. The strings are normalized
+        with :func:`umls_downloader.utils.normalize_string` and empty strings are skipped.
+    :returns: The lexicon
+    """
+    string_ids: Dict[str, int] = {}
+    string_column, cui_column = array("i"), array("i")
+    for text, cui in pairs:
+        normalized = normalize_string(text)
+        if not normalized:
+            continue
+        string_column.append(string_ids.setdefault(normalized, len(string_ids)))
+        cui_column.append(cui_to_int(cui))
+
+    encoded = [string.encode("utf-8") for string in string_ids]
+    del string_ids
+    order = sorted(range(len(encoded)), key=encoded.__getitem__)
+    # rank[i] is the position of the i-th string in sorted order
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order), dtype=np.int32)
+
+    offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum([len(encoded[i]) for i in order], out=offsets[1:])
+    strings = np.frombuffer(b"".join(encoded[i] for i in order), dtype=np.uint8)
+    del encoded
+
+    # sort and deduplicate the (string, CUI) pairs
+    edges = np.unique(
+        np.stack(
+            [
+                rank[np.frombuffer(string_column, dtype=np.int32)],
+                np.frombuffer(cui_column, dtype=np.int32),
+            ],
+            axis=1,
+        ),
+        axis=0,
+    ).reshape(-1, 2)
+    cui_indptr = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges[:, 0], minlength=len(order)), out=cui_indptr[1:])
+    logger.info("[umls] built lexicon with %d strings and %d pairs", len(order), len(edges))
+    return Lexicon(
+        strings=strings,
+        offsets=offsets,
+        cui_indptr=cui_indptr,
+        cuis=np.ascontiguousarray(edges[:, 1]),
+    )
+
+
+def ensure_lexicon(
+    version: Optional[str] = None, *, api_key: Optional[str] = None, force: bool = False
+) -> Lexicon:
+    """Build the lexicon for every string in MRCONSO, or load it if it has been built before.
+
+    :param version: The version of UMLS to ensure. If not given, is looked up
+        with :mod:`bioversions`.
+    :param api_key: An API key. If not given, is looked up using
+        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
+    :param force: Should the lexicon be rebuilt, even if it already exists? This
+        does not re-download MRCONSO.
+    :returns: The lexicon, memory-mapped from the versioned cache directory
+    """
+    path = download_umls(version=version, api_key=api_key)
+    directory = path.parent.joinpath("lexicon")
+    if not directory.is_dir() or force:
+        with open_umls(version=path.parent.name, api_key=api_key) as file:
+            build_lexicon((row[STR_INDEX], row[CUI_INDEX]) for row in iter_rrf(file)).save(
+                directory
+            )
+    return Lexicon.load(directory)
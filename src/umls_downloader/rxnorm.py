@@ -2,18 +2,28 @@
 
 """Download RxNorm content through the UMLS Terminology Services."""
 
+import logging
+import sqlite3
+import zipfile
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, List, Optional, Tuple, Union
 
 import pystow.utils
 
 from .api import download_tgt_versioned
+from .utils import iter_rrf, normalize_string
 
 __all__ = [
     "download_rxnorm",
     "download_rxnorm_prescribable",
+    "iter_rxnorm",
+    "RxNormIndex",
+    "build_rxnorm_index",
+    "ensure_rxnorm_index",
 ]
 
+logger = logging.getLogger(__name__)
+
 MODULE = pystow.module("bio", "rxnorm")
 RXNORM_URL_FMT = "https://download.nlm.nih.gov/umls/kss/rxnorm/RxNorm_full_{version}.zip"
 
@@ -26,7 +36,11 @@ def _fix_rxnorm_version(rxnorm_version: str) -> str:
 
 
 def download_rxnorm(
-    version: Optional[str] = None, *, api_key: Optional[str] = None, force: bool = False
+    version: Optional[str] = None,
+    *,
+    api_key: Optional[str] = None,
+    force: bool = False,
+    revalidate: bool = False,
 ) -> Path:
     """Ensure the given version of the RxNorm monthly file.
 
@@ -35,6 +49,8 @@ def download_rxnorm(
     :param api_key: An API key. If not given, is looked up using
         :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
     :param force: Should the file be re-downloaded, even if it already exists?
+    :param revalidate: Should the file be re-downloaded only if it has changed
+        on the server? See :func:`umls_downloader.download_tgt`.
     :return: The path of the file for the given version of RxNorm.
     """
     return download_tgt_versioned(
@@ -42,6 +58,7 @@ def download_rxnorm(
         version=version,
         api_key=api_key,
         force=force,
+        revalidate=revalidate,
         version_key="rxnorm",
         module_key="rxnorm",
         version_transform=_fix_rxnorm_version,
@@ -66,3 +83,255 @@ def download_rxnorm_prescribable(version: Optional[str] = None, *, force: bool =
     version = _fix_rxnorm_version(version)
     url = f"https://download.nlm.nih.gov/rxnorm/RxNorm_full_prescribe_{version}.zip"
     return MODULE.ensure(version, url=url, force=force)
+
+
+def iter_rxnorm(path: Union[str, Path], name: str) -> Iterable[List[str]]:
+    """Iterate over the rows of an RRF file inside an RxNorm archive.
+
+    :param path: The path to an RxNorm archive, like the one returned by
+        :func:`download_rxnorm`
+    :param name: The name of the file, like ``RXNCONSO.RRF``, ``RXNREL.RRF``,
+        or ``RXNSAT.RRF``
+    :yields: The fields of each row
+    :raises FileNotFoundError: if the file is not in the archive
+    """
+    with zipfile.ZipFile(path) as zip_file:
+        for zip_info in zip_file.infolist():
+            if zip_info.filename.endswith(f"rrf/{name}"):
+                with zip_file.open(zip_info, mode="r") as file:
+                    yield from iter_rrf(file)
+                return
+    raise FileNotFoundError(f"no {name} in {path}")
+
+
+#: Relationships through which a product inherits the ingredients of another concept,
+#: e.g., an SCD consists_of SCDCs, an SBD is a tradename_of an SCD, and a pack contains SCDs
+_INGREDIENT_CARRIERS = ("consists_of", "tradename_of", "contains")
+_INGREDIENT_TTYS = ("IN", "PIN", "MIN")
+
+_SCHEMA = """
+CREATE TABLE names (rxcui INTEGER, name TEXT, tty TEXT, sab TEXT, normalized TEXT);
+CREATE TABLE relationships (subject INTEGER, rela TEXT, object INTEGER);
+CREATE TABLE ndcs (ndc TEXT, rxcui INTEGER);
+CREATE TABLE ingredients (product INTEGER, ingredient INTEGER, PRIMARY KEY (product, ingredient))
+    WITHOUT ROWID;
+"""
+
+_INDEXES = """
+CREATE INDEX names_rxcui ON names (rxcui);
+CREATE INDEX names_normalized ON names (normalized);
+CREATE INDEX relationships_subject ON relationships (subject, rela);
+CREATE INDEX relationships_object ON relationships (object, rela);
+CREATE INDEX ndcs_ndc ON ndcs (ndc);
+CREATE INDEX ingredients_ingredient ON ingredients (ingredient);
+"""
+
+_DIRECT_INGREDIENTS = """
+INSERT INTO ingredients
+SELECT subject, object FROM relationships
+WHERE rela IN ('has_ingredient', 'has_precise_ingredient', 'has_ingredients');
+"""
+
+
+def build_rxnorm_index(path: Union[str, Path], database: Union[str, Path]) -> None:
+    """Build a SQLite index over the RxNorm RRF files.
+
+    :param path: The path to an RxNorm archive, like the one returned by
+        :func:`download_rxnorm`
+    :param database: The path to the SQLite database to write. It is written to a
+        temporary file first, then moved into place, so a half-built index is
+        never picked up.
+
+    The index contains the following tables:
+
+    =============  =================================================================
+    names          The non-suppressed names from RXNCONSO, with their term type,
+                   source, and :func:`umls_downloader.utils.normalize_string` form
+    relationships  The concept-level RxNorm relationships from RXNREL, stored as
+                   ``subject rela object`` (i.e., ``RXCUI2 RELA RXCUI1``)
+    ingredients    The ingredients (IN, PIN, and MIN) of each concept, inherited
+                   through the ``consists_of``, ``tradename_of``, and
+                   ``contains`` relationships
+    ndcs           The normalized 11-digit NDCs from RXNSAT
+    =============  =================================================================
+    """
+    database = Path(database)
+    tmp_database = database.with_name(database.name + ".tmp")
+    if tmp_database.exists():
+        tmp_database.unlink()
+    with sqlite3.connect(str(tmp_database)) as connection:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(_SCHEMA)
+
+        logger.info("[rxnorm] indexing RXNCONSO")
+        connection.executemany(
+            "INSERT INTO names VALUES (?, ?, ?, ?, ?)",
+            (
+                (int(row[0]), row[14], row[12], row[11], normalize_string(row[14]))
+                for row in iter_rxnorm(path, "RXNCONSO.RRF")
+                if row[16] == "N"
+            ),
+        )
+
+        logger.info("[rxnorm] indexing RXNREL")
+        connection.executemany(
+            "INSERT INTO relationships VALUES (?, ?, ?)",
+            (
+                (int(row[4]), row[7], int(row[0]))
+                for row in iter_rxnorm(path, "RXNREL.RRF")
+                if row[10] == "RXNORM" and row[2] == "CUI" and row[6] == "CUI" and row[7]
+            ),
+        )
+
+        logger.info("[rxnorm] indexing RXNSAT")
+        connection.executemany(
+            "INSERT INTO ndcs VALUES (?, ?)",
+            (
+                (row[10], int(row[0]))
+                for row in iter_rxnorm(path, "RXNSAT.RRF")
+                if row[8] == "NDC" and row[9] == "RXNORM" and row[11] == "N"
+            ),
+        )
+        connection.executescript(_INDEXES)
+
+        logger.info("[rxnorm] inferring ingredients")
+        connection.execute(_DIRECT_INGREDIENTS)
+        carriers = ", ".join("?" * len(_INGREDIENT_CARRIERS))
+        while True:
+            cursor = connection.execute(
+                f"""
+                INSERT OR IGNORE INTO ingredients
+                SELECT r.subject, i.ingredient
+                FROM relationships AS r JOIN ingredients AS i ON r.object = i.product
+                WHERE r.rela IN ({carriers})
+                """,  # noqa:S608
+                _INGREDIENT_CARRIERS,
+            )
+            if not cursor.rowcount:
+                break
+        # only keep actual ingredients, since e.g. SBDCs have brand names via has_ingredient
+        connection.execute(
+            """
+            DELETE FROM ingredients WHERE ingredient NOT IN (
+                SELECT rxcui FROM names WHERE sab = 'RXNORM' AND tty IN (?, ?, ?)
+            )
+            """,
+            _INGREDIENT_TTYS,
+        )
+    connection.close()
+    tmp_database.replace(database)
+
+
+class RxNormIndex:
+    """A read-only SQLite index over RxNorm, built by :func:`build_rxnorm_index`."""
+
+    def __init__(self, database: Union[str, Path]):
+        """Open the index.
+
+        :param database: The path to the SQLite database
+        """
+        # file URIs have to be absolute
+        self.database = Path(database).resolve()
+        self.connection = sqlite3.connect(
+            f"{self.database.as_uri()}?mode=ro", uri=True, check_same_thread=False
+        )
+
+    def close(self) -> None:
+        """Close the connection to the database."""
+        self.connection.close()
+
+    def __enter__(self) -> "RxNormIndex":
+        """Use the index as a context manager."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Close the connection when the context exits."""
+        self.close()
+
+    def _column(self, query: str, *params) -> List:
+        return [value for value, in self.connection.execute(query, params)]
+
+    def names(self, rxcui: int) -> List[Tuple[str, str, str]]:
+        """Get the names of a concept.
+
+        :param rxcui: An RxNorm concept unique identifier
+        :returns: A list of triples of names, term types (TTYs), and sources (SABs)
+        """
+        return self.connection.execute(
+            "SELECT name, tty, sab FROM names WHERE rxcui = ?", (rxcui,)
+        ).fetchall()
+
+    def lookup(self, name: str) -> List[int]:
+        """Look up the concepts with a given name.
+
+        :param name: A name, which is normalized with
+            :func:`umls_downloader.utils.normalize_string` before lookup
+        :returns: A sorted list of RxNorm concept unique identifiers
+        """
+        return self._column(
+            "SELECT DISTINCT rxcui FROM names WHERE normalized = ? ORDER BY rxcui",
+            normalize_string(name),
+        )
+
+    def related(self, rxcui: int, rela: str) -> List[int]:
+        """Get the concepts related to the given one.
+
+        :param rxcui: An RxNorm concept unique identifier
+        :param rela: A relationship attribute, like ``has_tradename``
+        :returns: A sorted list of RxNorm concept unique identifiers
+        """
+        return self._column(
+            "SELECT object FROM relationships WHERE subject = ? AND rela = ? ORDER BY object",
+            rxcui,
+            rela,
+        )
+
+    def ingredients(self, rxcui: int) -> List[int]:
+        """Get the ingredients of a product.
+
+        :param rxcui: An RxNorm concept unique identifier for a product, like an SCD
+        :returns: A sorted list of RxNorm concept unique identifiers for ingredients
+        """
+        return self._column(
+            "SELECT ingredient FROM ingredients WHERE product = ? ORDER BY ingredient", rxcui
+        )
+
+    def products(self, rxcui: int) -> List[int]:
+        """Get the products containing an ingredient.
+
+        :param rxcui: An RxNorm concept unique identifier for an ingredient
+        :returns: A sorted list of RxNorm concept unique identifiers for products
+        """
+        return self._column(
+            "SELECT product FROM ingredients WHERE ingredient = ? ORDER BY product", rxcui
+        )
+
+    def ndc(self, ndc: str) -> List[int]:
+        """Look up the concepts for a National Drug Code.
+
+        :param ndc: An 11-digit NDC, without dashes
+        :returns: A sorted list of RxNorm concept unique identifiers
+        """
+        return self._column("SELECT DISTINCT rxcui FROM ndcs WHERE ndc = ? ORDER BY rxcui", ndc)
+
+
+def ensure_rxnorm_index(
+    version: Optional[str] = None, *, api_key: Optional[str] = None, force: bool = False
+) -> RxNormIndex:
+    """Ensure and open the SQLite index for the given version of RxNorm.
+
+    :param version: The version of RxNorm to ensure. If not given, is looked up
+        with :mod:`bioversions`.
+    :param api_key: An API key. If not given, is looked up using
+        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
+    :param force: Should the index be rebuilt, even if it already exists? This
+        does not re-download the archive.
+    :returns: The index, stored next to the archive in the versioned cache. It
+        can be used as a context manager to close it when done.
+    """
+    path = download_rxnorm(version=version, api_key=api_key)
+    database = path.with_name("rxnorm.sqlite")
+    if not database.is_file() or force:
+        build_rxnorm_index(path, database)
+    return RxNormIndex(database)
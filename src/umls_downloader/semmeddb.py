@@ -62,10 +62,8 @@ def download_semmeddb_sentence(**kwargs) -> Path:
 
 
 def _download_semmeddb_helper(
-    url: str, *, api_key: Optional[str] = None, force: bool = False
+    url: str, *, api_key: Optional[str] = None, force: bool = False, revalidate: bool = False
 ) -> Path:
     path = MODULE.join(SEMMEDDB_VERSION, name=name_from_url(url))
-    if path.is_file() and not force:
-        return path
-    download_tgt(url, path, api_key=api_key)
+    download_tgt(url, path, api_key=api_key, force=force, revalidate=revalidate)
     return path
@@ -2,9 +2,14 @@
 
 """Download functionality for SNOMED-CT."""
 
+import io
+import sys
+import zipfile
+from array import array
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, List, NamedTuple, Optional, Union
 
+import numpy as np
 import pystow
 from pystow.utils import name_from_url
 
@@ -13,6 +18,12 @@ from umls_downloader import download_tgt
 __all__ = [
     "download_snomed_international",
     "download_snomed_us",
+    "SnomedConcepts",
+    "SnomedDescriptions",
+    "SnomedRelationships",
+    "load_snomed_concepts",
+    "load_snomed_descriptions",
+    "load_snomed_relationships",
 ]
 
 # TODO add versioning
@@ -39,10 +50,155 @@ def download_snomed_international(**kwargs) -> Path:
 
 
 def _download_snomed_helper(
-    url: str, *, api_key: Optional[str] = None, force: bool = False
+    url: str, *, api_key: Optional[str] = None, force: bool = False, revalidate: bool = False
 ) -> Path:
     path = MODULE.join(name=name_from_url(url))
-    if path.is_file() and not force:
-        return path
-    download_tgt(url, path, api_key=api_key)
+    download_tgt(url, path, api_key=api_key, force=force, revalidate=revalidate)
     return path
+
+
+class SnomedConcepts(NamedTuple):
+    """Active concepts from a SNOMED-CT RF2 snapshot, as parallel arrays."""
+
+    #: The SCTIDs of the concepts, as an int64 array
+    ids: np.ndarray
+    #: The SCTIDs of the modules the concepts belong to, as an int64 array
+    module_ids: np.ndarray
+    #: The SCTIDs of the definition status (primitive or fully defined), as an int64 array
+    definition_status_ids: np.ndarray
+
+
+class SnomedDescriptions(NamedTuple):
+    """Active descriptions from a SNOMED-CT RF2 snapshot, as parallel arrays."""
+
+    #: The SCTIDs of the descriptions, as an int64 array
+    ids: np.ndarray
+    #: The SCTIDs of the described concepts, as an int64 array
+    concept_ids: np.ndarray
+    #: The SCTIDs of the description types (FSN, synonym, definition), as an int64 array
+    type_ids: np.ndarray
+    #: The language codes of the descriptions, as interned strings
+    language_codes: List[str]
+    #: The terms of the descriptions, as interned strings
+    terms: List[str]
+
+
+class SnomedRelationships(NamedTuple):
+    """Active inferred relationships from a SNOMED-CT RF2 snapshot, as parallel arrays."""
+
+    #: The SCTIDs of the relationships, as an int64 array
+    ids: np.ndarray
+    #: The SCTIDs of the source concepts, as an int64 array
+    source_ids: np.ndarray
+    #: The SCTIDs of the destination concepts, as an int64 array
+    destination_ids: np.ndarray
+    #: The role groups of the relationships, as an int64 array
+    groups: np.ndarray
+    #: The SCTIDs of the relationship types (e.g., 116680003 for |Is a|), as an int64 array
+    type_ids: np.ndarray
+    #: The SCTIDs of the characteristic types (e.g., inferred), as an int64 array
+    characteristic_type_ids: np.ndarray
+
+
+def _iter_rf2(path: Union[str, Path], prefix: str) -> Iterable[List[str]]:
+    """Iterate over the active rows of the RF2 snapshot files in a SNOMED-CT archive.
+
+    :param path: The path to a SNOMED-CT RF2 zip archive, like the ones returned
+        by :func:`download_snomed_us` and :func:`download_snomed_international`
+    :param prefix: The prefix of the file names to read, like ``sct2_Concept_Snapshot``
+    :yields: The fields of each active row, without the trailing newline
+    :raises FileNotFoundError: if no file with the given prefix is in the snapshot
+    """
+    with zipfile.ZipFile(path) as zip_file:
+        zip_infos = [
+            zip_info
+            for zip_info in zip_file.infolist()
+            if "/Snapshot/" in zip_info.filename
+            and zip_info.filename.rsplit("/", 1)[-1].startswith(prefix)
+        ]
+        if not zip_infos:
+            raise FileNotFoundError(f"no {prefix} file in {path}")
+        for zip_info in zip_infos:
+            with zip_file.open(zip_info, mode="r") as binary_file:
+                file = io.TextIOWrapper(binary_file, encoding="utf-8", newline="")
+                next(file)  # skip the header
+                for line in file:
+                    fields = line.rstrip("\r\n").split("\t")
+                    # the third column is always the active flag
+                    if fields[2] == "1":
+                        yield fields
+
+
+def _to_int64(values: array) -> np.ndarray:
+    return np.frombuffer(values, dtype=np.int64)
+
+
+def load_snomed_concepts(path: Union[str, Path]) -> SnomedConcepts:
+    """Stream the active concepts out of a SNOMED-CT RF2 archive.
+
+    :param path: The path to a SNOMED-CT RF2 zip archive, like the ones returned
+        by :func:`download_snomed_us` and :func:`download_snomed_international`
+    :returns: The active concepts, as int64 arrays of SCTIDs
+    """
+    ids, module_ids, definition_status_ids = array("q"), array("q"), array("q")
+    for fields in _iter_rf2(path, "sct2_Concept_Snapshot"):
+        ids.append(int(fields[0]))
+        module_ids.append(int(fields[3]))
+        definition_status_ids.append(int(fields[4]))
+    return SnomedConcepts(
+        ids=_to_int64(ids),
+        module_ids=_to_int64(module_ids),
+        definition_status_ids=_to_int64(definition_status_ids),
+    )
+
+
+def load_snomed_descriptions(path: Union[str, Path]) -> SnomedDescriptions:
+    """Stream the active descriptions out of a SNOMED-CT RF2 archive.
+
+    :param path: The path to a SNOMED-CT RF2 zip archive, like the ones returned
+        by :func:`download_snomed_us` and :func:`download_snomed_international`
+    :returns: The active descriptions, as int64 arrays of SCTIDs and interned
+        strings for the terms and language codes
+    """
+    ids, concept_ids, type_ids = array("q"), array("q"), array("q")
+    language_codes, terms = [], []
+    for fields in _iter_rf2(path, "sct2_Description_Snapshot"):
+        ids.append(int(fields[0]))
+        concept_ids.append(int(fields[4]))
+        type_ids.append(int(fields[6]))
+        language_codes.append(sys.intern(fields[5]))
+        terms.append(sys.intern(fields[7]))
+    return SnomedDescriptions(
+        ids=_to_int64(ids),
+        concept_ids=_to_int64(concept_ids),
+        type_ids=_to_int64(type_ids),
+        language_codes=language_codes,
+        terms=terms,
+    )
+
+
+def load_snomed_relationships(path: Union[str, Path]) -> SnomedRelationships:
+    """Stream the active inferred relationships out of a SNOMED-CT RF2 archive.
+
+    :param path: The path to a SNOMED-CT RF2 zip archive, like the ones returned
+        by :func:`download_snomed_us` and :func:`download_snomed_international`
+    :returns: The active relationships, as int64 arrays of SCTIDs
+    """
+    ids, source_ids, destination_ids = array("q"), array("q"), array("q")
+    groups, type_ids, characteristic_type_ids = array("q"), array("q"), array("q")
+    # the trailing underscore skips the stated relationships and concrete values files
+    for fields in _iter_rf2(path, "sct2_Relationship_Snapshot_"):
+        ids.append(int(fields[0]))
+        source_ids.append(int(fields[4]))
+        destination_ids.append(int(fields[5]))
+        groups.append(int(fields[6]))
+        type_ids.append(int(fields[7]))
+        characteristic_type_ids.append(int(fields[8]))
+    return SnomedRelationships(
+        ids=_to_int64(ids),
+        source_ids=_to_int64(source_ids),
+        destination_ids=_to_int64(destination_ids),
+        groups=_to_int64(groups),
+        type_ids=_to_int64(type_ids),
+        characteristic_type_ids=_to_int64(characteristic_type_ids),
+    )
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+"""A precomputed transitive closure of the SNOMED-CT |Is a| hierarchy.
+
+SNOMED-CT is a polyhierarchy, so interval encodings don't apply directly. Instead,
+the closure is stored as a compressed sparse row (CSR) table in both directions:
+the sorted ancestors of every concept and the sorted descendants of every concept.
+Subsumption checks are binary searches in a single row and descendant enumeration
+is a slice, both of which work directly on memory-mapped arrays.
+"""
+
+import logging
+from collections import deque
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+
+from .snomed import MODULE, SnomedRelationships, load_snomed_relationships
+from .utils import load_arrays, save_arrays
+
+__all__ = [
+    "IS_A",
+    "SnomedHierarchy",
+    "build_snomed_hierarchy",
+    "ensure_snomed_hierarchy",
+]
+
+logger = logging.getLogger(__name__)
+
+#: The SCTID for the 116680003 |Is a| relationship type
+IS_A = 116680003
+
+
+class SnomedHierarchy:
+    """A transitive closure index over the SNOMED-CT |Is a| relationships."""
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        ancestor_indptr: np.ndarray,
+        ancestor_indices: np.ndarray,
+        descendant_indptr: np.ndarray,
+        descendant_indices: np.ndarray,
+    ):
+        """Initialize the index.
+
+        :param ids: The sorted SCTIDs of all concepts in the hierarchy. The position
+            of a concept in this array is its index in the other arrays.
+        :param ancestor_indptr: The CSR row pointers for the ancestors
+        :param ancestor_indices: The CSR column indices for the ancestors, sorted
+            within each row
+        :param descendant_indptr: The CSR row pointers for the descendants
+        :param descendant_indices: The CSR column indices for the descendants,
+            sorted within each row
+        """
+        self.ids = ids
+        self.ancestor_indptr = ancestor_indptr
+        self.ancestor_indices = ancestor_indices
+        self.descendant_indptr = descendant_indptr
+        self.descendant_indices = descendant_indices
+
+    def __len__(self) -> int:
+        """Get the number of concepts in the hierarchy."""
+        return len(self.ids)
+
+    def __contains__(self, sctid: int) -> bool:
+        """Check if a concept is in the hierarchy."""
+        return self._index(sctid) is not None
+
+    def _index(self, sctid: int) -> Optional[int]:
+        i = int(np.searchsorted(self.ids, sctid))
+        if i < len(self.ids) and self.ids[i] == sctid:
+            return i
+        return None
+
+    def _row(self, indptr: np.ndarray, indices: np.ndarray, sctid: int) -> np.ndarray:
+        i = self._index(sctid)
+        if i is None:
+            raise KeyError(sctid)
+        return indices[indptr[i] : indptr[i + 1]]
+
+    def is_descendant(self, sctid: int, ancestor_sctid: int, include_self: bool = False) -> bool:
+        """Check if a concept is a descendant of another in O(log n).
+
+        :param sctid: The SCTID of the candidate descendant
+        :param ancestor_sctid: The SCTID of the candidate ancestor
+        :param include_self: Should a concept count as its own descendant? This
+            corresponds to the ``<<`` operator in the Expression Constraint Language,
+            whereas the default corresponds to ``<``.
+        :returns: If the first concept is a descendant of the second. Concepts
+            that aren't in the hierarchy are never descendants.
+        """
+        if include_self and sctid == ancestor_sctid:
+            return sctid in self
+        i, j = self._index(sctid), self._index(ancestor_sctid)
+        if i is None or j is None:
+            return False
+        row = self.ancestor_indices[self.ancestor_indptr[i] : self.ancestor_indptr[i + 1]]
+        k = int(np.searchsorted(row, j))
+        return k < len(row) and row[k] == j
+
+    def ancestors(self, sctid: int) -> np.ndarray:
+        """Get the SCTIDs of all ancestors of a concept.
+
+        :param sctid: The SCTID of a concept
+        :returns: A sorted int64 array of the SCTIDs of the ancestors
+        """
+        return self.ids[self._row(self.ancestor_indptr, self.ancestor_indices, sctid)]
+
+    def descendants(self, sctid: int) -> np.ndarray:
+        """Get the SCTIDs of all descendants of a concept.
+
+        :param sctid: The SCTID of a concept
+        :returns: A sorted int64 array of the SCTIDs of the descendants
+        """
+        return self.ids[self._row(self.descendant_indptr, self.descendant_indices, sctid)]
+
+    def mask_descendants(
+        self, sctids: np.ndarray, ancestor_sctid: int, include_self: bool = False
+    ) -> np.ndarray:
+        """Check which of many concepts are descendants of a given concept.
+
+        :param sctids: An array of SCTIDs of candidate descendants
+        :param ancestor_sctid: The SCTID of the candidate ancestor
+        :param include_self: Should a concept count as its own descendant?
+        :returns: A boolean array with the same shape as ``sctids``
+        """
+        sctids = np.asarray(sctids, dtype=np.int64)
+        descendants = self.descendants(ancestor_sctid)
+        if include_self:
+            descendants = np.union1d(descendants, [ancestor_sctid])
+        if not len(descendants):
+            return np.zeros(sctids.shape, dtype=bool)
+        positions = np.searchsorted(descendants, sctids)
+        positions[positions == len(descendants)] = 0
+        return descendants[positions] == sctids
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """Save the index to a directory.
+
+        :param directory: The directory in which the arrays are written
+        """
+        save_arrays(
+            directory,
+            {
+                "ids": self.ids,
+                "ancestor_indptr": self.ancestor_indptr,
+                "ancestor_indices": self.ancestor_indices,
+                "descendant_indptr": self.descendant_indptr,
+                "descendant_indices": self.descendant_indices,
+            },
+        )
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> "SnomedHierarchy":
+        """Load an index that was saved with :meth:`save`.
+
+        :param directory: The directory in which the arrays were written
+        :param mmap: Should the arrays be memory-mapped?
+        :returns: The index
+        """
+        return cls(**load_arrays(directory, mmap=mmap))
+
+
+def build_snomed_hierarchy(relationships: SnomedRelationships) -> SnomedHierarchy:
+    """Build the transitive closure of the active |Is a| relationships.
+
+    :param relationships: The active relationships, like from
+        :func:`umls_downloader.snomed.load_snomed_relationships`
+    :returns: The closure index
+    :raises ValueError: if the |Is a| relationships contain a cycle
+    """
+    is_a = relationships.type_ids == IS_A
+    children, parents = relationships.source_ids[is_a], relationships.destination_ids[is_a]
+    ids = np.unique(np.concatenate([children, parents]))
+    # re-index to positions in the ids array and drop duplicate edges
+    edges = np.unique(
+        np.stack([np.searchsorted(ids, children), np.searchsorted(ids, parents)], axis=1),
+        axis=0,
+    )
+    children, parents = edges[:, 0], edges[:, 1]
+    n = len(ids)
+
+    # parent lists, in CSR form since edges are sorted by child
+    parent_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(children, minlength=n), out=parent_indptr[1:])
+
+    # children lists for a topological traversal from the roots
+    order = np.argsort(parents, kind="stable")
+    child_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(parents, minlength=n), out=child_indptr[1:])
+    child_indices = children[order]
+
+    in_degree = np.diff(parent_indptr)
+    queue = deque(np.flatnonzero(in_degree == 0).tolist())
+    in_degree = in_degree.tolist()
+    # roots keep the empty array
+    ancestors: List[np.ndarray] = [np.empty(0, dtype=np.int32)] * n
+    n_done = 0
+    while queue:
+        node = queue.popleft()
+        n_done += 1
+        node_parents = parents[parent_indptr[node] : parent_indptr[node + 1]]
+        if len(node_parents):
+            ancestors[node] = np.unique(
+                np.concatenate([node_parents, *(ancestors[p] for p in node_parents.tolist())])
+            ).astype(np.int32)
+        for child in child_indices[child_indptr[node] : child_indptr[node + 1]].tolist():
+            in_degree[child] -= 1
+            if not in_degree[child]:
+                queue.append(child)
+    if n_done != n:
+        raise ValueError(f"the |Is a| hierarchy has a cycle among {n - n_done} concepts")
+
+    ancestor_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in ancestors], out=ancestor_indptr[1:])
+    ancestor_indices = np.concatenate(ancestors) if n else np.empty(0, dtype=np.int32)
+    logger.info("[snomed] built closure of %d concepts with %d pairs", n, len(ancestor_indices))
+
+    # transpose the closure, sorting descendants within each ancestor
+    rows = np.repeat(np.arange(n, dtype=np.int32), np.diff(ancestor_indptr))
+    order = np.lexsort((rows, ancestor_indices))
+    descendant_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ancestor_indices, minlength=n), out=descendant_indptr[1:])
+    return SnomedHierarchy(
+        ids=ids,
+        ancestor_indptr=ancestor_indptr,
+        ancestor_indices=ancestor_indices,
+        descendant_indptr=descendant_indptr,
+        descendant_indices=rows[order],
+    )
+
+
+def ensure_snomed_hierarchy(path: Union[str, Path], *, force: bool = False) -> SnomedHierarchy:
+    """Build the closure index for a SNOMED-CT archive, or load it if it has been built before.
+
+    :param path: The path to a SNOMED-CT RF2 zip archive, like the ones returned
+        by :func:`umls_downloader.download_snomed_us` and
+        :func:`umls_downloader.download_snomed_international`
+    :param force: Should the index be rebuilt, even if it already exists?
+    :returns: The closure index, memory-mapped from the ``~/.data/bio/snomed/hierarchy``
+        directory
+    """
+    directory = MODULE.join("hierarchy").joinpath(Path(path).stem)
+    if not directory.is_dir() or force:
+        logger.info("[snomed] building |Is a| closure for %s", path)
+        build_snomed_hierarchy(load_snomed_relationships(path)).save(directory)
+    return SnomedHierarchy.load(directory)
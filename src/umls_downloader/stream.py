@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+"""Decode zip archives while they are being downloaded.
+
+The members of a zip archive are each preceded by a local file header, so they
+can be decoded in order without seeking to the central directory at the end of
+the archive. This is how :func:`umls_downloader.open_umls` can yield rows of
+MRCONSO before the archive has finished downloading.
+"""
+
+import io
+import logging
+import struct
+import zipfile
+import zlib
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+
+__all__ = [
+    "iter_zip_stream",
+]
+
+logger = logging.getLogger(__name__)
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_DATA_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+#: Signatures of the central directory and its end, after which there are no more members
+_END_SIGNATURES = {b"PK\x01\x02", b"PK\x05\x05", b"PK\x05\x06", b"PK\x06\x06"}
+_ZIP64_EXTRA = 0x0001
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+
+
+class _Source:
+    """A stream of chunks that can be read by exact sizes and pushed back onto."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.buffer = b""
+
+    def read(self) -> bytes:
+        """Read the next chunk, which is empty at the end of the stream."""
+        if self.buffer:
+            data, self.buffer = self.buffer, b""
+            return data
+        for chunk in self.chunks:
+            if chunk:
+                return chunk
+        return b""
+
+    def read_exactly(self, n: int) -> bytes:
+        """Read the given number of bytes, or fewer at the end of the stream."""
+        parts, size = [], 0
+        while size < n:
+            chunk = self.read()
+            if not chunk:
+                break
+            parts.append(chunk)
+            size += len(chunk)
+        data = b"".join(parts)
+        self.unread(data[n:])
+        return data[:n]
+
+    def unread(self, data: bytes) -> None:
+        """Push bytes back onto the front of the stream."""
+        if data:
+            self.buffer = data + self.buffer
+
+
+class _MemberReader(io.RawIOBase):
+    """A reader over the decompressed contents of a single zip member."""
+
+    def __init__(
+        self,
+        source: _Source,
+        name: str,
+        method: int,
+        flags: int,
+        crc: int,
+        compressed_size: int,
+        zip64: bool,
+    ):
+        self.source = source
+        self.name = name
+        self.flags = flags
+        self.expected_crc = crc
+        self.remaining = compressed_size
+        self.zip64 = zip64
+        self.crc = 0
+        self.done = False
+        self.decompressor: Optional["zlib._Decompress"]
+        if method == zipfile.ZIP_DEFLATED:
+            self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        elif method == zipfile.ZIP_STORED:
+            if flags & _FLAG_DATA_DESCRIPTOR:
+                raise zipfile.BadZipFile(f"can't stream {name}, which is stored without a size")
+            self.decompressor = None
+        else:
+            raise NotImplementedError(f"unsupported compression method {method} for {name}")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        """Decompress bytes into the buffer, returning zero at the end of the member."""
+        size = 0
+        while not size and not self.done:
+            size = self._decompress(memoryview(buffer))
+        return size
+
+    def _decompress(self, buffer: memoryview) -> int:
+        if self.decompressor is None:
+            data = self.source.read() if self.remaining else b""
+            if self.remaining and not data:
+                raise zipfile.BadZipFile(f"truncated archive while reading {self.name}")
+            out = data[: min(len(buffer), self.remaining)]
+            # give back whatever didn't fit or belongs to the next member
+            self.source.unread(data[len(out) :])
+            self.remaining -= len(out)
+            finished = not self.remaining
+        else:
+            data = self.decompressor.unconsumed_tail or self.source.read()
+            if not data:
+                raise zipfile.BadZipFile(f"truncated archive while reading {self.name}")
+            out = self.decompressor.decompress(data, len(buffer))
+            finished = self.decompressor.eof
+            if finished:
+                self.source.unread(self.decompressor.unused_data)
+
+        self.crc = zlib.crc32(out, self.crc)
+        buffer[: len(out)] = out
+        if finished:
+            self._finish()
+        return len(out)
+
+    def _finish(self) -> None:
+        self.done = True
+        if self.flags & _FLAG_DATA_DESCRIPTOR:
+            # the signature of the data descriptor is optional
+            crc = self.source.read_exactly(4)
+            if crc == _DATA_DESCRIPTOR_SIGNATURE:
+                crc = self.source.read_exactly(4)
+            self.source.read_exactly(16 if self.zip64 else 8)
+            (self.expected_crc,) = struct.unpack("<I", crc)
+        if self.crc != self.expected_crc:
+            raise zipfile.BadZipFile(f"bad CRC-32 for {self.name}")
+
+    def drain(self) -> None:
+        """Skip the rest of the member."""
+        buffer = bytearray(1 << 16)
+        while self.readinto(buffer):
+            pass
+
+
+def _parse_zip64_extra(extra: bytes, usize: int, csize: int) -> Tuple[bool, int]:
+    """Get if there's a zip64 extra field, and the compressed size from it."""
+    while len(extra) >= 4:
+        tag, length = struct.unpack("<HH", extra[:4])
+        if tag == _ZIP64_EXTRA:
+            values = extra[4 : 4 + length]
+            # the uncompressed size comes first, but only if it's missing from the header
+            if usize == 0xFFFFFFFF:
+                values = values[8:]
+            if csize == 0xFFFFFFFF:
+                (csize,) = struct.unpack("<Q", values[:8])
+            return True, csize
+        extra = extra[4 + length :]
+    return False, csize
+
+
+def iter_zip_stream(chunks: Iterable[bytes]) -> Iterator[Tuple[str, BinaryIO]]:
+    """Iterate over the members of a zip archive from a stream of chunks of bytes.
+
+    :param chunks: The bytes of a zip archive, in order, like from
+        :meth:`requests.Response.iter_content`
+    :yields: Pairs of the name of each member and a binary file with its
+        decompressed contents. Each file is only valid until the next member is
+        yielded, and whatever wasn't read from it is skipped.
+    :raises BadZipFile: if the archive is truncated, a member can't be
+        streamed, or the CRC of a member doesn't match once it is read to the end
+    """
+    source = _Source(chunks)
+    while True:
+        signature = source.read_exactly(4)
+        if not signature or signature in _END_SIGNATURES:
+            return
+        if signature != _LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f"bad local file header signature: {signature!r}")
+        header = signature + source.read_exactly(_LOCAL_HEADER.size - 4)
+        if len(header) < _LOCAL_HEADER.size:
+            raise zipfile.BadZipFile("truncated local file header")
+        (
+            _,
+            _version,
+            flags,
+            method,
+            _time,
+            _date,
+            crc,
+            csize,
+            usize,
+            name_length,
+            extra_length,
+        ) = _LOCAL_HEADER.unpack(header)
+        raw_name = source.read_exactly(name_length)
+        name = raw_name.decode("utf-8" if flags & _FLAG_UTF8 else "cp437")
+        zip64, csize = _parse_zip64_extra(source.read_exactly(extra_length), usize, csize)
+        reader = _MemberReader(
+            source,
+            name=name,
+            method=method,
+            flags=flags,
+            crc=crc,
+            compressed_size=csize,
+            zip64=zip64,
+        )
+        logger.debug("[umls] streaming %s", name)
+        yield name, io.BufferedReader(reader)
+        reader.drain()
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+"""Synchronize the local cache with a manifest of resources.
+
+A manifest is a YAML (or JSON) file listing the resources to keep in the
+:mod:`pystow` cache, like in:
+
+.. code-block:: yaml
+
+    # the maximum number of simultaneous downloads
+    concurrency: 4
+    # the maximum total bandwidth, in bytes per second. Accepts K, M, and G suffixes
+    bandwidth: 50M
+    resources:
+      - resource: umls
+        version: 2023AB
+      - resource: umls_full
+        version: latest
+        # resources with a lower priority number are downloaded first. Defaults to 0
+        priority: 1
+      - resource: rxnorm
+      - resource: snomed_us
+      - resource: semmeddb
+        # if not given, downloads all SemMedDB files
+        files: [predication, concept]
+
+Versions can be omitted or given as ``latest``, in which case they are looked
+up with :mod:`bioversions`. The SNOMED-CT and SemMedDB resources aren't
+versioned yet, so only ``latest`` is allowed for them.
+"""
+
+import json
+import logging
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple, Union
+
+from pystow.utils import name_from_url
+
+from . import semmeddb, snomed
+from .api import RateLimiter, _resolve_versioned, download_tgt
+from .rxnorm import RXNORM_URL_FMT, _fix_rxnorm_version
+from .umls import UMLS_METATHESAURUS_FULL_FMT, UMLS_METATHESAURUS_URL_FMT, UMLS_URL_FMT
+
+__all__ = [
+    "SyncTask",
+    "load_manifest",
+    "plan_sync",
+    "sync",
+]
+
+logger = logging.getLogger(__name__)
+
+_SIZE_SUFFIXES = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+SEMMEDDB_FILES = {
+    "citations": semmeddb.SEMMEDDB_CITATIONS,
+    "entity": semmeddb.SEMMEDDB_ENTITY,
+    "concept": semmeddb.SEMMEDDB_CONCEPT,
+    "predication": semmeddb.SEMMEDDB_PREDICATION,
+    "predication_aux": semmeddb.SEMMEDDB_PREDICATION_AUX,
+    "sentence": semmeddb.SEMMEDDB_SENTENCE,
+}
+
+
+class SyncTask(NamedTuple):
+    """A file to download while synchronizing."""
+
+    #: The priority of the task. Lower numbers are downloaded first.
+    priority: int
+    #: The name of the resource in the manifest
+    resource: str
+    #: The URL to download through the UMLS ticket granting system
+    url: str
+    #: The local path in the :mod:`pystow` cache
+    path: Path
+
+
+def _versioned(url_fmt: str, module_key: str, version_key: str, **kwargs):
+    def _resolve(entry: Mapping[str, Any]) -> List[Tuple[str, Path]]:
+        return [
+            _resolve_versioned(
+                url_fmt,
+                _get_version(entry),
+                module_key=module_key,
+                version_key=version_key,
+                **kwargs,
+            )
+        ]
+
+    return _resolve
+
+
+def _unversioned(resolve: Callable[[Mapping[str, Any]], List[Tuple[str, Path]]]):
+    def _resolve(entry: Mapping[str, Any]) -> List[Tuple[str, Path]]:
+        if _get_version(entry) is not None:
+            raise ValueError(f"{entry['resource']} is not versioned, so only latest is allowed")
+        return resolve(entry)
+
+    return _resolve
+
+
+def _resolve_snomed(url: str):
+    return _unversioned(lambda _entry: [(url, snomed.MODULE.join(name=name_from_url(url)))])
+
+
+def _resolve_semmeddb(entry: Mapping[str, Any]) -> List[Tuple[str, Path]]:
+    files = entry.get("files") or list(SEMMEDDB_FILES)
+    invalid = set(files).difference(SEMMEDDB_FILES)
+    if invalid:
+        raise ValueError(f"invalid SemMedDB files: {sorted(invalid)}")
+    return [
+        (
+            SEMMEDDB_FILES[key],
+            semmeddb.MODULE.join(
+                semmeddb.SEMMEDDB_VERSION, name=name_from_url(SEMMEDDB_FILES[key])
+            ),
+        )
+        for key in files
+    ]
+
+
+#: Functions that get the URLs and local paths for each resource in a manifest
+RESOLVERS: Dict[str, Callable[[Mapping[str, Any]], List[Tuple[str, Path]]]] = {
+    "umls": _versioned(UMLS_URL_FMT, "umls", "umls"),
+    "umls_metathesaurus": _versioned(UMLS_METATHESAURUS_URL_FMT, "umls", "umls"),
+    "umls_full": _versioned(UMLS_METATHESAURUS_FULL_FMT, "umls", "umls"),
+    "rxnorm": _versioned(RXNORM_URL_FMT, "rxnorm", "rxnorm", version_transform=_fix_rxnorm_version),
+    "snomed_us": _resolve_snomed(snomed.SNOMED_CT_US),
+    "snomed_international": _resolve_snomed(snomed.SNOMED_CT_INT),
+    "semmeddb": _unversioned(_resolve_semmeddb),
+}
+
+
+def _get_version(entry: Mapping[str, Any]) -> Optional[str]:
+    version = entry.get("version")
+    if version is None or version == "latest":
+        return None
+    return str(version)
+
+
+def _parse_size(value: Union[None, int, float, str]) -> Optional[float]:
+    """Parse a number of bytes, like ``50M``."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    value = value.strip().upper().rstrip("B")
+    if value and value[-1] in _SIZE_SUFFIXES:
+        return float(value[:-1]) * _SIZE_SUFFIXES[value[-1]]
+    return float(value)
+
+
+def load_manifest(path: Union[str, Path]) -> Dict[str, Any]:
+    """Load a manifest from a YAML or JSON file.
+
+    :param path: The path to the manifest. Files ending in ``.json`` are read as
+        JSON, and everything else as YAML, which requires :mod:`yaml`.
+    :returns: The manifest
+    """
+    path = Path(path)
+    with path.open() as file:
+        if path.suffix == ".json":
+            return json.load(file)
+        import yaml
+
+        return yaml.safe_load(file)
+
+
+def plan_sync(manifest: Mapping[str, Any], *, force: bool = False) -> List[SyncTask]:
+    """Get the files in a manifest that are missing from the cache.
+
+    :param manifest: A manifest, like from :func:`load_manifest`
+    :param force: Should all files be included, even if they are already cached?
+    :returns: The missing files, sorted by priority. Files that are listed more
+        than once are only included once, with the lowest priority number.
+    :raises ValueError: if a resource is unknown
+    """
+    tasks: Dict[Path, SyncTask] = {}
+    for entry in manifest.get("resources", []):
+        resource = entry["resource"]
+        if resource not in RESOLVERS:
+            raise ValueError(f"unknown resource: {resource}. Use one of {sorted(RESOLVERS)}")
+        for url, path in RESOLVERS[resource](entry):
+            if not force and path.is_file():
+                continue
+            task = SyncTask(int(entry.get("priority", 0)), resource, url, path)
+            # two tasks for the same path would write to the same temporary file
+            if path not in tasks or task < tasks[path]:
+                tasks[path] = task
+    return sorted(tasks.values())
+
+
+def sync(
+    manifest: Mapping[str, Any],
+    *,
+    api_key: Optional[str] = None,
+    force: bool = False,
+    concurrency: Optional[int] = None,
+    bandwidth: Union[None, int, float, str] = None,
+) -> List[SyncTask]:
+    """Download the files in a manifest that are missing from the cache.
+
+    :param manifest: A manifest, like from :func:`load_manifest`
+    :param api_key: An API key. If not given, is looked up using
+        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
+    :param force: Should all files be re-downloaded, even if they are already cached?
+    :param concurrency: The maximum number of simultaneous downloads. If not given,
+        uses the ``concurrency`` from the manifest, or 1.
+    :param bandwidth: The maximum total bandwidth in bytes per second, like ``50M``.
+        If not given, uses the ``bandwidth`` from the manifest, or no limit.
+    :returns: The files that were downloaded
+    :raises RuntimeError: if any download failed. The others are still completed.
+    """
+    tasks = plan_sync(manifest, force=force)
+    concurrency = concurrency or manifest.get("concurrency") or 1
+    rate = _parse_size(bandwidth or manifest.get("bandwidth"))
+    rate_limiter = RateLimiter(rate) if rate else None
+
+    task_queue: "queue.PriorityQueue[SyncTask]" = queue.PriorityQueue()
+    for task in tasks:
+        task_queue.put(task)
+    failures: List[Tuple[SyncTask, BaseException]] = []
+
+    def _work() -> None:
+        while True:
+            try:
+                task = task_queue.get_nowait()
+            except queue.Empty:
+                return
+            logger.info("[%s] downloading %s", task.resource, task.url)
+            try:
+                download_tgt(
+                    task.url, task.path, api_key=api_key, force=True, rate_limiter=rate_limiter
+                )
+            except Exception as e:
+                logger.warning("[%s] failed to download %s: %s", task.resource, task.url, e)
+                failures.append((task, e))
+
+    threads = [
+        threading.Thread(target=_work, daemon=True) for _ in range(min(concurrency, len(tasks)))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise RuntimeError(
+            "failed to download: " + ", ".join(str(task.url) for task, _ in failures)
+        )
+    return tasks
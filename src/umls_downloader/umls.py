@@ -2,12 +2,16 @@
 
 """Download content."""
 
+import json
+import logging
 import zipfile
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Iterable, List, Optional, Set
 
-from .api import download_tgt_versioned
+from .api import _resolve_versioned, download_tgt_versioned, stream_tgt
+from .stream import iter_zip_stream
+from .utils import get_filter_values, get_spec_key
 
 __all__ = [
     "download_umls",
@@ -17,6 +21,33 @@ __all__ = [
     "open_umls_full",
     "open_umls_semantic_types",
     "open_umls_hierarchy",
+    "ensure_umls_subset",
+    "open_umls_subset",
+]
+
+logger = logging.getLogger(__name__)
+
+#: The columns of MRCONSO.RRF, see
+#: https://www.ncbi.nlm.nih.gov/books/NBK9685/table/ch03.T.concept_names_and_sources_file_mr/
+MRCONSO_COLUMNS = [
+    "CUI",
+    "LAT",
+    "TS",
+    "LUI",
+    "STT",
+    "SUI",
+    "ISPREF",
+    "AUI",
+    "SAUI",
+    "SCUI",
+    "SDUI",
+    "SAB",
+    "TTY",
+    "CODE",
+    "STR",
+    "SRL",
+    "SUPPRESS",
+    "CVF",
 ]
 
 UMLS_URL_FMT = "https://download.nlm.nih.gov/umls/kss/{version}/umls-{version}-mrconso.zip"
@@ -34,6 +65,7 @@ def _download_umls(
     *,
     api_key: Optional[str] = None,
     force: bool = False,
+    revalidate: bool = False,
 ) -> Path:
     return download_tgt_versioned(
         url_fmt=url_fmt,
@@ -42,11 +74,16 @@ def _download_umls(
         module_key="umls",
         api_key=api_key,
         force=force,
+        revalidate=revalidate,
     )
 
 
 def download_umls(
-    version: Optional[str] = None, *, api_key: Optional[str] = None, force: bool = False
+    version: Optional[str] = None,
+    *,
+    api_key: Optional[str] = None,
+    force: bool = False,
+    revalidate: bool = False,
 ) -> Path:
     """Ensure the given version of the UMLS MRCONSO.RRF file.
 
@@ -55,13 +92,21 @@ def download_umls(
     :param api_key: An API key. If not given, is looked up using
         :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
     :param force: Should the file be re-downloaded, even if it already exists?
+    :param revalidate: Should the file be re-downloaded only if it has changed
+        on the server? See :func:`umls_downloader.download_tgt`.
     :return: The path of the file for the given version of UMLS.
     """
-    return _download_umls(url_fmt=UMLS_URL_FMT, version=version, api_key=api_key, force=force)
+    return _download_umls(
+        url_fmt=UMLS_URL_FMT, version=version, api_key=api_key, force=force, revalidate=revalidate
+    )
 
 
 def download_umls_full(
-    version: Optional[str] = None, *, api_key: Optional[str] = None, force: bool = False
+    version: Optional[str] = None,
+    *,
+    api_key: Optional[str] = None,
+    force: bool = False,
+    revalidate: bool = False,
 ) -> Path:
     """Ensure the given version of the UMLS MRSTY.RRF file.
 
@@ -70,15 +115,25 @@ def download_umls_full(
     :param api_key: An API key. If not given, is looked up using
         :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
     :param force: Should the file be re-downloaded, even if it already exists?
+    :param revalidate: Should the file be re-downloaded only if it has changed
+        on the server? See :func:`umls_downloader.download_tgt`.
     :return: The path of the file for the given version of UMLS.
     """
     return _download_umls(
-        url_fmt=UMLS_METATHESAURUS_FULL_FMT, version=version, api_key=api_key, force=force
+        url_fmt=UMLS_METATHESAURUS_FULL_FMT,
+        version=version,
+        api_key=api_key,
+        force=force,
+        revalidate=revalidate,
     )
 
 
 def download_umls_metathesaurus(
-    version: Optional[str] = None, *, api_key: Optional[str] = None, force: bool = False
+    version: Optional[str] = None,
+    *,
+    api_key: Optional[str] = None,
+    force: bool = False,
+    revalidate: bool = False,
 ) -> Path:
     """Ensure the given version of the UMLS metathesaurus zip archive.
 
@@ -87,15 +142,27 @@ def download_umls_metathesaurus(
     :param api_key: An API key. If not given, is looked up using
         :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
     :param force: Should the file be re-downloaded, even if it already exists?
+    :param revalidate: Should the file be re-downloaded only if it has changed
+        on the server? See :func:`umls_downloader.download_tgt`.
     :return: The path of the file for the given version of UMLS.
     """
     return _download_umls(
-        url_fmt=UMLS_METATHESAURUS_URL_FMT, version=version, api_key=api_key, force=force
+        url_fmt=UMLS_METATHESAURUS_URL_FMT,
+        version=version,
+        api_key=api_key,
+        force=force,
+        revalidate=revalidate,
     )
 
 
 @contextmanager
-def open_umls(version: Optional[str] = None, *, api_key: Optional[str] = None, force: bool = False):
+def open_umls(
+    version: Optional[str] = None,
+    *,
+    api_key: Optional[str] = None,
+    force: bool = False,
+    stream: bool = False,
+):
     """Ensure and open the UMLS MRCONSO.RRF file from the given version.
 
     :param version: The version of UMLS to ensure. If not given, is looked up
@@ -103,9 +170,24 @@ def open_umls(version: Optional[str] = None, *, api_key: Optional[str] = None, f
     :param api_key: An API key. If not given, is looked up using
         :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
     :param force: Should the file be re-downloaded, even if it already exists?
+    :param stream: If the file has to be downloaded, should it be decompressed
+        while it's downloading? Then, rows can be read as soon as the first
+        bytes arrive instead of after the whole archive is cached. The archive
+        is still written to the cache, and the rest of it is downloaded when
+        the context exits.
     :yields: The file, which is used in the context manager.
     """
-    path = download_umls(version=version, api_key=api_key, force=force)
+    if stream:
+        url, path = _resolve_versioned(UMLS_URL_FMT, version, module_key="umls", version_key="umls")
+        if force or not path.is_file():
+            with stream_tgt(url, path, api_key=api_key) as chunks:
+                for name, member in iter_zip_stream(chunks):
+                    if "MRCONSO.RRF" in name:
+                        yield member
+                        break
+            return
+    else:
+        path = download_umls(version=version, api_key=api_key, force=force)
     with zipfile.ZipFile(path) as zip_file:
         # In the 2023AB release, they added an intermediate META directory,
         # which means we have to go searching for the file by name
@@ -202,3 +284,117 @@ def open_umls_hierarchy(
     """
     with open_umls_full(name="MRHIER.RRF", version=version, api_key=api_key, force=force) as file:
         yield file
+
+
+def _get_subset_spec(
+    sabs: Optional[Iterable[str]], languages: Optional[Iterable[str]], include_suppressed: bool
+) -> Dict[str, Any]:
+    return {
+        "sabs": get_filter_values(sabs, "sabs"),
+        "languages": get_filter_values(languages, "languages"),
+        "include_suppressed": include_suppressed,
+    }
+
+
+def _encode_values(values: Optional[List[str]]) -> Optional[Set[bytes]]:
+    if values is None:
+        return None
+    return {value.encode("utf-8") for value in values}
+
+
+def ensure_umls_subset(
+    version: Optional[str] = None,
+    *,
+    sabs: Optional[Iterable[str]] = None,
+    languages: Optional[Iterable[str]] = None,
+    include_suppressed: bool = True,
+    api_key: Optional[str] = None,
+    force: bool = False,
+) -> Path:
+    """Ensure a filtered subset of the UMLS MRCONSO.RRF file from the given version.
+
+    :param version: The version of UMLS to ensure. If not given, is looked up
+        with :mod:`bioversions`.
+    :param sabs: The sources to keep, like ``{"MSH", "SNOMEDCT_US", "RXNORM"}``.
+        If not given, keeps all sources.
+    :param languages: The languages to keep, like ``{"ENG"}``. If not given,
+        keeps all languages.
+    :param include_suppressed: Should suppressible and obsolete rows be kept? If
+        false, only keeps rows where ``SUPPRESS`` is ``N``.
+    :param api_key: An API key. If not given, is looked up using
+        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
+    :param force: Should the subset be rebuilt, even if it already exists? This
+        does not re-download MRCONSO.
+    :return: The path of the subset, an uncompressed RRF file stored in the
+        ``subsets`` directory of the versioned cache. Its name contains a hash of
+        the filters, so subsequent calls with the same filters return immediately.
+        The filters are written next to it in a JSON file with the same name.
+    """
+    spec = _get_subset_spec(sabs=sabs, languages=languages, include_suppressed=include_suppressed)
+    key = get_spec_key(spec)
+    archive_path = download_umls(version=version, api_key=api_key)
+    directory = archive_path.parent.joinpath("subsets")
+    path = directory.joinpath(f"MRCONSO-{key}.RRF")
+    if path.is_file() and not force:
+        return path
+
+    sab_values = _encode_values(spec["sabs"])
+    language_values = _encode_values(spec["languages"])
+    directory.mkdir(exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    logger.info("[umls] writing MRCONSO subset %s", spec)
+    with open_umls(version=archive_path.parent.name, api_key=api_key) as file:
+        with tmp_path.open("wb") as out:
+            for line in file:
+                # filter on the raw bytes, since decoding is the most expensive part
+                fields = line.split(b"|", 17)
+                if language_values is not None and fields[1] not in language_values:
+                    continue
+                if sab_values is not None and fields[11] not in sab_values:
+                    continue
+                if not include_suppressed and fields[16] != b"N":
+                    continue
+                out.write(line)
+    tmp_path.replace(path)
+    path.with_suffix(".json").write_text(json.dumps(spec, indent=2, sort_keys=True))
+    return path
+
+
+@contextmanager
+def open_umls_subset(
+    version: Optional[str] = None,
+    *,
+    sabs: Optional[Iterable[str]] = None,
+    languages: Optional[Iterable[str]] = None,
+    include_suppressed: bool = True,
+    api_key: Optional[str] = None,
+    force: bool = False,
+):
+    """Ensure and open a filtered subset of the UMLS MRCONSO.RRF file from the given version.
+
+    :param version: The version of UMLS to ensure. If not given, is looked up
+        with :mod:`bioversions`.
+    :param sabs: The sources to keep, like ``{"MSH", "SNOMEDCT_US", "RXNORM"}``.
+        If not given, keeps all sources.
+    :param languages: The languages to keep, like ``{"ENG"}``. If not given,
+        keeps all languages.
+    :param include_suppressed: Should suppressible and obsolete rows be kept? If
+        false, only keeps rows where ``SUPPRESS`` is ``N``.
+    :param api_key: An API key. If not given, is looked up using
+        :func:`pystow.get_config` with the ``umls`` module and ``api_key`` key.
+    :param force: Should the subset be rebuilt, even if it already exists?
+    :yields: The file, which is used in the context manager. It has the same
+        format as the one from :func:`open_umls`.
+
+    .. seealso:: :func:`ensure_umls_subset`
+    """
+    path = ensure_umls_subset(
+        version=version,
+        sabs=sabs,
+        languages=languages,
+        include_suppressed=include_suppressed,
+        api_key=api_key,
+        force=force,
+    )
+    with path.open("rb") as file:
+        yield file
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""Utilities for reading downloaded content and persisting the indexes built on top of it."""
+
+import hashlib
+import io
+import json
+import re
+import shutil
+from array import array
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+__all__ = [
+    "CategoricalEncoder",
+    "cui_to_int",
+    "get_filter_values",
+    "get_spec_key",
+    "int_to_cui",
+    "iter_rrf",
+    "normalize_string",
+    "save_arrays",
+    "load_arrays",
+]
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+class CategoricalEncoder:
+    """Encode the values of a low-cardinality column as small integer codes."""
+
+    def __init__(self, categories: Sequence[str] = ()):
+        """Initialize the encoder.
+
+        :param categories: Categories to give the first codes, in order
+        """
+        self.categories: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self.values = array("i")
+        for category in categories:
+            self.code(category)
+
+    def code(self, category: str) -> int:
+        """Get the code for a category, assigning the next code if it's new.
+
+        :param category: The category
+        :returns: The code
+        """
+        code = self._codes.get(category)
+        if code is None:
+            code = self._codes[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def append(self, category: str) -> None:
+        """Encode a value and append its code to :data:`values`.
+
+        :param category: The value
+        """
+        self.values.append(self.code(category))
+
+    def to_numpy(self) -> np.ndarray:
+        """Get the appended codes in the smallest unsigned integer type that fits them.
+
+        :returns: An array of codes
+        """
+        return np.frombuffer(self.values, dtype=np.int32).astype(
+            np.min_scalar_type(max(len(self.categories) - 1, 0))
+        )
+
+
+def cui_to_int(identifier: str) -> int:
+    """Encode a UMLS identifier as an integer by stripping its prefix letter.
+
+    :param identifier: A UMLS identifier, like a CUI, AUI, SUI, or LUI
+    :returns: The numeric part of the identifier
+
+    >>> cui_to_int("C0000005")
+    5
+    """
+    return int(identifier[1:])
+
+
+def int_to_cui(value: int, prefix: str = "C") -> str:
+    """Decode an integer back into a UMLS identifier.
+
+    :param value: The numeric part of the identifier
+    :param prefix: The prefix letter, like ``C`` for CUIs or ``A`` for AUIs
+    :returns: The UMLS identifier, zero-padded to seven digits
+
+    >>> int_to_cui(5)
+    'C0000005'
+    """
+    return f"{prefix}{value:07d}"
+
+
+def iter_rrf(file: IO[bytes]) -> Iterable[List[str]]:
+    """Iterate over the rows of a Rich Release Format (RRF) file.
+
+    :param file: A binary file, like the ones yielded by :func:`umls_downloader.open_umls`
+    :yields: The fields of each row. RRF lines have a trailing pipe, which is removed.
+    """
+    for line in io.TextIOWrapper(file, encoding="utf-8", newline=""):
+        yield line.rstrip("\r\n").split("|")[:-1]
+
+
+def normalize_string(text: str) -> str:
+    """Normalize a string for exact dictionary matching.
+
+    :param text: A string, like a name from MRCONSO or RXNCONSO
+    :returns: The string, case-folded and with each run of punctuation and
+        whitespace collapsed to a single space
+
+    >>> normalize_string("Acetaminophen  325 MG [Tylenol]")
+    'acetaminophen 325 mg tylenol'
+    """
+    return _NON_WORD.sub(" ", text.casefold()).strip()
+
+
+def get_filter_values(values: Optional[Iterable[str]], name: str) -> Optional[List[str]]:
+    """Get the sorted, unique values of a filter, like the sources to keep.
+
+    :param values: The values to keep, or None to keep everything
+    :param name: The name of the filter, for the error message
+    :returns: The sorted unique values, or None
+    :raises TypeError: if a single string is given, since it would otherwise be
+        split into its characters
+    """
+    if values is None:
+        return None
+    if isinstance(values, str):
+        raise TypeError(f"{name} should be a collection of strings, like [{values!r}]")
+    return sorted(set(values))
+
+
+def get_spec_key(spec: Mapping[str, Any]) -> str:
+    """Get a short, stable key for the filters an artifact was built with.
+
+    :param spec: A JSON-serializable dictionary of filters
+    :returns: The first 16 characters of the SHA-256 hex digest of the sorted JSON
+    """
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def save_arrays(directory: Union[str, Path], arrays: Dict[str, np.ndarray]) -> None:
+    """Save arrays as a directory of ``.npy`` files so they can later be memory-mapped.
+
+    :param directory: The directory to write to. The arrays are written to a
+        sibling directory first, then an existing index is renamed aside, the new
+        one is renamed into place, and the old one is removed. A half-written
+        index is never picked up by :func:`load_arrays`, and processes that
+        already memory-mapped the old arrays keep their pages.
+    :param arrays: A dictionary from names to arrays
+    :raises FileExistsError: if the directory exists and holds anything other
+        than ``.npy`` files, so it isn't an index written by this function
+    """
+    directory = Path(directory)
+    if directory.exists() and (
+        not directory.is_dir() or any(path.suffix != ".npy" for path in directory.iterdir())
+    ):
+        raise FileExistsError(f"not overwriting {directory}, which isn't a directory of arrays")
+    tmp_directory = directory.with_name(directory.name + ".tmp")
+    old_directory = directory.with_name(directory.name + ".old")
+    for path in (tmp_directory, old_directory):
+        if path.exists():
+            shutil.rmtree(path)
+    tmp_directory.mkdir(parents=True)
+    for name, values in arrays.items():
+        np.save(tmp_directory.joinpath(f"{name}.npy"), values, allow_pickle=False)
+    if directory.exists():
+        directory.rename(old_directory)
+    tmp_directory.rename(directory)
+    if old_directory.exists():
+        shutil.rmtree(old_directory)
+
+
+def load_arrays(directory: Union[str, Path], mmap: bool = True) -> Dict[str, np.ndarray]:
+    """Load arrays written with :func:`save_arrays`.
+
+    :param directory: The directory to read from
+    :param mmap: Should the arrays be memory-mapped read-only? This makes loading
+        nearly instantaneous and lets forked processes share the pages.
+    :returns: A dictionary from names to arrays
+    """
+    return {
+        path.stem: np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+        for path in Path(directory).glob("*.npy")
+    }
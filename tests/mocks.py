@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""Mocks shared between tests."""
+
+from typing import Mapping, Optional
+
+__all__ = [
+    "MockResponse",
+]
+
+
+class MockResponse:
+    """A minimal streaming response, in place of :class:`requests.Response`."""
+
+    def __init__(
+        self,
+        status_code: int,
+        content: bytes = b"",
+        headers: Optional[Mapping[str, str]] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        """Initialize the response.
+
+        :param status_code: The HTTP status code
+        :param content: The body of the response
+        :param headers: The headers of the response
+        :param chunk_size: The size of the chunks to stream the content in. If not
+            given, uses the one passed to :meth:`iter_content`.
+        """
+        self.status_code = status_code
+        self.content = content
+        self.headers = dict(headers or {})
+        self.chunk_size = chunk_size
+        #: The number of bytes streamed so far
+        self.consumed = 0
+
+    @property
+    def ok(self) -> bool:
+        """Get if the response was successful."""
+        return self.status_code < 400
+
+    def raise_for_status(self) -> None:
+        """Raise on an error status."""
+        if not self.ok:
+            raise ValueError(self.status_code)
+
+    def iter_content(self, chunk_size: int):
+        """Iterate over the content, keeping track of how much was consumed."""
+        chunk_size = self.chunk_size or chunk_size
+        for i in range(0, len(self.content), chunk_size):
+            chunk = self.content[i : i + chunk_size]
+            self.consumed += len(chunk)
+            yield chunk
+
+    def __enter__(self):
+        """Use the response as a context manager."""
+        return self
+
+    def __exit__(self, *args):
+        """Do nothing when the context exits."""
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for downloading through the UMLS ticket granting system."""
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from umls_downloader.api import download_tgt
+
+from .mocks import MockResponse
+
+URL = "https://download.nlm.nih.gov/umls/kss/2023AB/umls-2023AB-mrconso.zip"
+
+
+class TestRevalidate(unittest.TestCase):
+    """Test conditional re-downloading."""
+
+    def setUp(self) -> None:
+        """Make a temporary directory and mock out the service ticket."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name).joinpath("umls-2023AB-mrconso.zip")
+        self.validators_path = self.path.with_name(self.path.name + ".validators.json")
+        self.patch = mock.patch("umls_downloader.api._get_service_ticket", return_value="ST-1")
+        self.patch.start()
+
+    def tearDown(self) -> None:
+        """Clean up the temporary directory and mocks."""
+        self.patch.stop()
+        self.directory.cleanup()
+
+    def _download(self, response: MockResponse, **kwargs) -> mock.MagicMock:
+        with mock.patch("umls_downloader.api.requests.get", return_value=response) as get:
+            download_tgt(URL, self.path, **kwargs)
+        return get
+
+    def test_validators_written(self):
+        """Test that the validators are stored next to a downloaded file."""
+        headers = {"ETag": '"v1"', "Last-Modified": "Mon, 06 Nov 2023 00:00:00 GMT"}
+        get = self._download(MockResponse(200, b"old", headers))
+        self.assertEqual(b"old", self.path.read_bytes())
+        self.assertEqual(headers, json.loads(self.validators_path.read_text()))
+        self.assertEqual({"ticket": "ST-1"}, get.call_args.kwargs["params"])
+        self.assertEqual({}, get.call_args.kwargs["headers"])
+
+    def test_existing(self):
+        """Test that an existing file isn't checked without revalidation."""
+        self.path.write_bytes(b"old")
+        get = self._download(MockResponse(200, b"new"))
+        get.assert_not_called()
+        self.assertEqual(b"old", self.path.read_bytes())
+
+    def test_not_modified(self):
+        """Test that a 304 response doesn't replace the file."""
+        self._download(MockResponse(200, b"old", {"ETag": '"v1"'}))
+        get = self._download(MockResponse(304), revalidate=True)
+        self.assertEqual({"If-None-Match": '"v1"'}, get.call_args.kwargs["headers"])
+        self.assertEqual(b"old", self.path.read_bytes())
+
+    def test_unchanged(self):
+        """Test that a matching ETag doesn't replace the file, even without a 304."""
+        self._download(MockResponse(200, b"old", {"ETag": '"v1"'}))
+        self._download(MockResponse(200, b"new", {"ETag": '"v1"'}), revalidate=True)
+        self.assertEqual(b"old", self.path.read_bytes())
+
+    def test_unchanged_last_modified(self):
+        """Test that a matching Last-Modified and Content-Length doesn't replace the file."""
+        headers = {"Last-Modified": "Mon, 06 Nov 2023 00:00:00 GMT", "Content-Length": "3"}
+        self._download(MockResponse(200, b"old", headers))
+        get = self._download(MockResponse(200, b"new", headers), revalidate=True)
+        self.assertEqual(
+            {"If-Modified-Since": headers["Last-Modified"]}, get.call_args.kwargs["headers"]
+        )
+        self.assertEqual(b"old", self.path.read_bytes())
+
+    def test_changed(self):
+        """Test that a changed file is re-downloaded and its validators updated."""
+        self._download(MockResponse(200, b"old", {"ETag": '"v1"'}))
+        self._download(MockResponse(200, b"new", {"ETag": '"v2"'}), revalidate=True)
+        self.assertEqual(b"new", self.path.read_bytes())
+        self.assertEqual({"ETag": '"v2"'}, json.loads(self.validators_path.read_text()))
+
+    def test_missing_validators(self):
+        """Test that an existing file without validators is re-downloaded."""
+        self.path.write_bytes(b"old")
+        self._download(MockResponse(200, b"new", {"ETag": '"v1"'}), revalidate=True)
+        self.assertEqual(b"new", self.path.read_bytes())
+
+    def test_error(self):
+        """Test that a failed download leaves the existing file alone."""
+        self._download(MockResponse(200, b"old", {"ETag": '"v1"'}))
+        with self.assertRaises(ValueError):
+            self._download(MockResponse(500), revalidate=True)
+        self.assertEqual(b"old", self.path.read_bytes())
+        self.assertFalse(self.path.with_name(self.path.name + ".part").exists())
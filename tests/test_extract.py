@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for extracting archives."""
+
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from umls_downloader.extract import extract_archive
+
+MEMBERS = {
+    "2023AB/META/MRCONSO.RRF": b"C0000005|ENG|\n" * 1000,
+    "2023AB/META/MRSTY.RRF": b"C0000005|T116|\n",
+    "2023AB/META/MRFILES.RRF": b"MRCONSO.RRF|\n",
+    "2023AB/META/CHANGE/DELETEDCUI.RRF": b"C0000001|\n",
+    "2023AB/README.txt": b"hello\n",
+}
+
+
+class TestExtract(unittest.TestCase):
+    """Test extracting archives in parallel."""
+
+    def setUp(self) -> None:
+        """Write a temporary archive."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name).joinpath("umls-2023AB-metathesaurus-full.zip")
+        with zipfile.ZipFile(self.path, mode="w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+            for name, content in MEMBERS.items():
+                zip_file.writestr(name, content)
+
+    def tearDown(self) -> None:
+        """Clean up the temporary directory."""
+        self.directory.cleanup()
+
+    def test_extract(self):
+        """Test extracting everything next to the archive."""
+        paths = extract_archive(self.path, processes=2)
+        directory = Path(self.directory.name).joinpath("umls-2023AB-metathesaurus-full")
+        self.assertEqual([directory.joinpath(name) for name in MEMBERS], paths)
+        for name, content in MEMBERS.items():
+            self.assertEqual(content, directory.joinpath(name).read_bytes())
+
+    def test_patterns(self):
+        """Test extracting members matching a glob from the right."""
+        paths = extract_archive(self.path, patterns=["META/MR*.RRF"], processes=2)
+        self.assertEqual(["MRCONSO.RRF", "MRSTY.RRF", "MRFILES.RRF"], [p.name for p in paths])
+
+    def test_skip(self):
+        """Test current files are skipped and stale ones are replaced."""
+        directory = Path(self.directory.name).joinpath("output")
+        mrsty, mrfiles = extract_archive(
+            self.path, directory, patterns=["MRSTY.RRF", "MRFILES.RRF"], processes=1
+        )
+        # same size, different content
+        mrsty.write_bytes(b"C0000005|T117|\n")
+        mtime = mrfiles.stat().st_mtime_ns
+        extract_archive(self.path, directory, patterns=["MRSTY.RRF", "MRFILES.RRF"], processes=1)
+        self.assertEqual(MEMBERS["2023AB/META/MRSTY.RRF"], mrsty.read_bytes())
+        self.assertEqual(mtime, mrfiles.stat().st_mtime_ns)
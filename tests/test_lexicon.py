@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the string lookup indexes."""
+
+import itertools
+import math
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from umls_downloader.fuzzy import FuzzyIndex, build_fuzzy_index
+from umls_downloader.lexicon import Lexicon, build_lexicon
+from umls_downloader.utils import normalize_string
+
+PAIRS = [
+    ("Heart Attack", "C0027051"),
+    ("heart-attack", "C0027051"),
+    ("Myocardial Infarction", "C0027051"),
+    ("MI", "C0027051"),
+    ("MI", "C0026266"),
+    ("Mitral Valve Insufficiency", "C0026266"),
+    ("Aspirin", "C0004057"),
+    ("Café au lait spots", "C0221263"),
+    ("---", "C0000005"),
+]
+
+
+class TestLexicon(unittest.TestCase):
+    """Test the normalized string lexicon."""
+
+    def setUp(self) -> None:
+        """Build a small lexicon."""
+        self.lexicon = build_lexicon(PAIRS)
+
+    def test_lookup(self):
+        """Test exact lookup after normalization."""
+        self.assertEqual(["C0027051"], self.lexicon.get("HEART ATTACK"))
+        self.assertEqual(["C0027051"], self.lexicon.get(" heart, attack."))
+        self.assertEqual(["C0026266", "C0027051"], self.lexicon.get("mi"))
+        self.assertEqual(["C0221263"], self.lexicon.get("CAFÉ AU LAIT SPOTS"))
+        self.assertEqual([], self.lexicon.get("heart"))
+        self.assertEqual([], self.lexicon.get("zzz"))
+        self.assertNotIn("---", self.lexicon)
+        self.assertIn("Aspirin", self.lexicon)
+
+    def test_sorted(self):
+        """Test the string table is sorted and deduplicated."""
+        strings = [self.lexicon.string(i) for i in range(len(self.lexicon))]
+        self.assertEqual(sorted(set(strings), key=str.encode), strings)
+        self.assertEqual(6, len(strings))
+
+    def test_round_trip(self):
+        """Test saving and memory-mapping the lexicon."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory).joinpath("lexicon")
+            self.lexicon.save(path)
+            lexicon = Lexicon.load(path)
+            self.assertEqual(len(self.lexicon), len(lexicon))
+            self.assertEqual(["C0004057"], lexicon.get("aspirin"))
+
+
+def _brute_force(query, strings, threshold, measure="cosine"):
+    def grams(text):
+        padded = f"$${text}$$"
+        return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+    x = grams(normalize_string(query))
+    rv = set()
+    for string in strings:
+        y = grams(string)
+        overlap = len(x & y)
+        if measure == "cosine":
+            score = overlap / math.sqrt(len(x) * len(y))
+        elif measure == "jaccard":
+            score = overlap / len(x | y)
+        else:
+            score = 2 * overlap / (len(x) + len(y))
+        if score >= threshold:
+            rv.add(string)
+    return rv
+
+
+class TestFuzzy(unittest.TestCase):
+    """Test the approximate string matching index."""
+
+    def setUp(self) -> None:
+        """Build a small lexicon and fuzzy index."""
+        self.lexicon = build_lexicon(PAIRS)
+        self.index = build_fuzzy_index(self.lexicon, chunk_size=2)
+
+    def test_search(self):
+        """Test searching with a misspelling."""
+        matches = self.index.search("myocardial infraction", threshold=0.6)
+        self.assertEqual(["myocardial infarction"], [match.string for match in matches])
+        self.assertEqual(["C0027051"], matches[0].cuis)
+        self.assertLess(matches[0].score, 1.0)
+        self.assertEqual(1.0, self.index.search("Heart attack!")[0].score)
+        self.assertEqual([], self.index.search("xyz"))
+
+    def test_brute_force(self):
+        """Test pruning gives the same results as scoring every string."""
+        strings = [self.lexicon.string(i) for i in range(len(self.lexicon))]
+        queries = ["heart", "mitral insufficiency", "cafe au lait", "aspirin", "m", "hart atack"]
+        for measure, threshold in itertools.product(["cosine", "jaccard", "dice"], [0.3, 0.5, 0.8]):
+            for query, matches in zip(
+                queries, self.index.search_many(queries, threshold=threshold, measure=measure)
+            ):
+                with self.subTest(query=query, threshold=threshold, measure=measure):
+                    self.assertEqual(
+                        _brute_force(query, strings, threshold, measure),
+                        {match.string for match in matches},
+                    )
+
+    def test_batches(self):
+        """Test searching in batches gives the same results as searching one by one."""
+        queries = ["heart", "mitral insufficiency", "cafe au lait", "aspirin", "m", "heart"]
+        with mock.patch("umls_downloader.fuzzy._BATCH_SIZE", 2):
+            matches = self.index.search_many(queries, threshold=0.3)
+        self.assertEqual([self.index.search(query, threshold=0.3) for query in queries], matches)
+
+    def test_measures(self):
+        """Test the other measures and invalid arguments."""
+        for measure in ["jaccard", "dice"]:
+            matches = self.index.search("aspirin tablet", threshold=0.3, measure=measure)
+            self.assertEqual("aspirin", matches[0].string)
+        with self.assertRaises(ValueError):
+            self.index.search("aspirin", measure="levenshtein")
+        with self.assertRaises(ValueError):
+            self.index.search("aspirin", threshold=0)
+
+    def test_round_trip(self):
+        """Test saving and memory-mapping the index."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory).joinpath("fuzzy")
+            self.index.save(path)
+            index = FuzzyIndex.load(self.lexicon, path)
+            self.assertEqual(3, index.ngram_size)
+            self.assertEqual(
+                self.index.search("mitral valve"),
+                index.search("mitral valve"),
+            )
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for indexing RxNorm."""
+
+import os
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from umls_downloader.rxnorm import RxNormIndex, build_rxnorm_index, ensure_rxnorm_index
+
+#: RXCUI, TTY, STR, SUPPRESS
+CONCEPTS = [
+    (161, "IN", "Acetaminophen", "N"),
+    (2670, "IN", "Codeine", "N"),
+    (202433, "BN", "Tylenol", "N"),
+    (315266, "SCDC", "Acetaminophen 325 MG", "N"),
+    (313782, "SCD", "Acetaminophen 325 MG Oral Tablet", "N"),
+    (209387, "SBD", "Acetaminophen 325 MG Oral Tablet [Tylenol]", "N"),
+    (999999, "SCD", "Obsolete Tablet", "O"),
+]
+#: RXCUI1, RELA, RXCUI2, which is read as RXCUI2 RELA RXCUI1
+RELATIONSHIPS = [
+    (161, "has_ingredient", 315266),
+    (315266, "consists_of", 313782),
+    (313782, "tradename_of", 209387),
+    (202433, "has_ingredient", 209387),
+]
+
+#: SAB, NDC for the NDC attributes of RXCUI 313782
+NDCS = [
+    ("RXNORM", "00904198261"),
+    ("MTHSPL", "0904-1982"),
+]
+
+
+def make_archive(path: Path) -> Path:
+    """Write a tiny RxNorm archive with the same layout as the full release."""
+    conso = "".join(
+        f"{rxcui}|ENG||||||{i}||||RXNORM|{tty}|{rxcui}|{name}||{suppress}||\n"
+        for i, (rxcui, tty, name, suppress) in enumerate(CONCEPTS)
+    )
+    rel = "".join(
+        f"{rxcui1}||CUI||{rxcui2}||CUI|{rela}|||RXNORM||||N||\n"
+        for rxcui1, rela, rxcui2 in RELATIONSHIPS
+    )
+    sat = "".join(f"313782|||1||||1|NDC|{sab}|{ndc}|N||\n" for sab, ndc in NDCS)
+    with zipfile.ZipFile(path, mode="w") as zip_file:
+        zip_file.writestr("rrf/RXNCONSO.RRF", conso)
+        zip_file.writestr("rrf/RXNREL.RRF", rel)
+        zip_file.writestr("rrf/RXNSAT.RRF", sat)
+    return path
+
+
+class TestIndex(unittest.TestCase):
+    """Test the RxNorm SQLite index."""
+
+    def setUp(self) -> None:
+        """Build an index from a temporary archive."""
+        self.directory = tempfile.TemporaryDirectory()
+        directory = Path(self.directory.name)
+        self.database = directory.joinpath("rxnorm.sqlite")
+        build_rxnorm_index(make_archive(directory.joinpath("rxnorm.zip")), self.database)
+        self.index = RxNormIndex(self.database)
+
+    def tearDown(self) -> None:
+        """Close the index and clean up the temporary directory."""
+        self.index.close()
+        self.directory.cleanup()
+
+    def test_names(self):
+        """Test looking up names and normalized names."""
+        self.assertEqual([("Acetaminophen", "IN", "RXNORM")], self.index.names(161))
+        self.assertEqual([209387], self.index.lookup("acetaminophen 325 mg oral tablet (TYLENOL)"))
+        self.assertEqual([], self.index.lookup("obsolete tablet"))
+
+    def test_ingredients(self):
+        """Test ingredients are inherited through product relationships."""
+        self.assertEqual([161], self.index.ingredients(315266))
+        self.assertEqual([161], self.index.ingredients(313782))
+        self.assertEqual([161], self.index.ingredients(209387))
+        self.assertEqual([209387, 313782, 315266], self.index.products(161))
+        self.assertEqual([313782], self.index.related(209387, "tradename_of"))
+
+    def test_ndc(self):
+        """Test looking up NDCs."""
+        self.assertEqual([313782], self.index.ndc("00904198261"))
+        self.assertEqual([], self.index.ndc("0904-1982"))
+
+    def test_relative_path(self):
+        """Test opening an index from a relative path."""
+        cwd = os.getcwd()
+        os.chdir(self.database.parent)
+        try:
+            with RxNormIndex(self.database.name) as index:
+                self.assertEqual([("Acetaminophen", "IN", "RXNORM")], index.names(161))
+        finally:
+            os.chdir(cwd)
+
+    def test_ensure(self):
+        """Test ensuring an index next to a downloaded archive returns the open index."""
+        path = make_archive(self.database.parent.joinpath("RxNorm_full_08072023.zip"))
+        with mock.patch("umls_downloader.rxnorm.download_rxnorm", return_value=path):
+            with ensure_rxnorm_index(force=True) as index:
+                self.assertIsInstance(index, RxNormIndex)
+                self.assertEqual([161], index.ingredients(313782))
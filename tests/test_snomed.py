@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for reading SNOMED-CT RF2 archives."""
+
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+from umls_downloader.snomed import (
+    load_snomed_concepts,
+    load_snomed_descriptions,
+    load_snomed_relationships,
+)
+from umls_downloader.snomed_hierarchy import SnomedHierarchy, build_snomed_hierarchy
+
+ROOT = "SnomedCT_TestRF2_PRODUCTION_20220101T120000Z"
+CONCEPT_HEADER = "id\teffectiveTime\tactive\tmoduleId\tdefinitionStatusId"
+DESCRIPTION_HEADER = (
+    "id\teffectiveTime\tactive\tmoduleId\tconceptId\tlanguageCode\ttypeId\tterm\tcaseSignificanceId"
+)
+RELATIONSHIP_HEADER = (
+    "id\teffectiveTime\tactive\tmoduleId\tsourceId\tdestinationId\trelationshipGroup"
+    "\ttypeId\tcharacteristicTypeId\tmodifierId"
+)
+IS_A = 116680003
+
+#: A small hierarchy with multiple inheritance: 4 is a 2 and 3, 2 and 3 are a 1, 5 is a 4
+CONCEPTS = [1, 2, 3, 4, 5]
+IS_A_EDGES = [(2, 1), (3, 1), (4, 2), (4, 3), (5, 4)]
+
+
+def _rows(header, rows):
+    return "\r\n".join([header, *("\t".join(map(str, row)) for row in rows)]) + "\r\n"
+
+
+def make_archive(path: Path) -> Path:
+    """Write a tiny RF2 archive that mimics the layout of the real releases."""
+    concepts = [(c, 20220101, 1, 900000000000207008, 900000000000074008) for c in CONCEPTS]
+    concepts.append((6, 20220101, 0, 900000000000207008, 900000000000074008))
+    descriptions = [
+        (100 + c, 20220101, 1, 900000000000207008, c, "en", 900000000000013009, f"term {c}", 0)
+        for c in CONCEPTS
+    ]
+    descriptions.append(
+        (106, 20220101, 0, 900000000000207008, 6, "en", 900000000000013009, "term 6", 0)
+    )
+    relationships = [
+        (1000 + i, 20220101, 1, 900000000000207008, s, d, 0, IS_A, 900000000000011006, 0)
+        for i, (s, d) in enumerate(IS_A_EDGES)
+    ]
+    relationships.append(
+        (2000, 20220101, 0, 900000000000207008, 5, 1, 0, IS_A, 900000000000011006, 0)
+    )
+    relationships.append(
+        (2001, 20220101, 1, 900000000000207008, 5, 3, 1, 363698007, 900000000000011006, 0)
+    )
+    with zipfile.ZipFile(path, mode="w") as zip_file:
+        snapshot = f"{ROOT}/Snapshot/Terminology"
+        zip_file.writestr(
+            f"{snapshot}/sct2_Concept_Snapshot_INT_20220101.txt", _rows(CONCEPT_HEADER, concepts)
+        )
+        zip_file.writestr(
+            f"{snapshot}/sct2_Description_Snapshot-en_INT_20220101.txt",
+            _rows(DESCRIPTION_HEADER, descriptions),
+        )
+        zip_file.writestr(
+            f"{snapshot}/sct2_Relationship_Snapshot_INT_20220101.txt",
+            _rows(RELATIONSHIP_HEADER, relationships),
+        )
+        # these should all be ignored
+        zip_file.writestr(
+            f"{snapshot}/sct2_StatedRelationship_Snapshot_INT_20220101.txt",
+            _rows(RELATIONSHIP_HEADER, [(3000, 20220101, 1, 0, 1, 5, 0, IS_A, 0, 0)]),
+        )
+        zip_file.writestr(
+            f"{ROOT}/Full/Terminology/sct2_Concept_Full_INT_20220101.txt",
+            _rows(CONCEPT_HEADER, [(7, 20220101, 1, 0, 0)]),
+        )
+    return path
+
+
+class TestRF2(unittest.TestCase):
+    """Test streaming the RF2 snapshot files."""
+
+    def setUp(self) -> None:
+        """Write a temporary RF2 archive."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = make_archive(Path(self.directory.name).joinpath("snomed.zip"))
+
+    def tearDown(self) -> None:
+        """Clean up the temporary directory."""
+        self.directory.cleanup()
+
+    def test_concepts(self):
+        """Test loading concepts keeps only active rows as int64 arrays."""
+        concepts = load_snomed_concepts(self.path)
+        self.assertEqual("int64", concepts.ids.dtype.name)
+        self.assertEqual(CONCEPTS, concepts.ids.tolist())
+
+    def test_descriptions(self):
+        """Test loading descriptions."""
+        descriptions = load_snomed_descriptions(self.path)
+        self.assertEqual(CONCEPTS, descriptions.concept_ids.tolist())
+        self.assertEqual([f"term {c}" for c in CONCEPTS], descriptions.terms)
+        self.assertIs(descriptions.language_codes[0], descriptions.language_codes[1])
+
+    def test_relationships(self):
+        """Test loading relationships ignores the stated relationships."""
+        relationships = load_snomed_relationships(self.path)
+        self.assertEqual(
+            IS_A_EDGES + [(5, 3)],
+            list(zip(relationships.source_ids.tolist(), relationships.destination_ids.tolist())),
+        )
+        self.assertEqual([0] * 5 + [1], relationships.groups.tolist())
+
+
+class TestHierarchy(unittest.TestCase):
+    """Test the |Is a| closure index."""
+
+    def setUp(self) -> None:
+        """Build the closure for a temporary RF2 archive."""
+        self.directory = tempfile.TemporaryDirectory()
+        path = make_archive(Path(self.directory.name).joinpath("snomed.zip"))
+        self.hierarchy = build_snomed_hierarchy(load_snomed_relationships(path))
+
+    def tearDown(self) -> None:
+        """Clean up the temporary directory."""
+        self.directory.cleanup()
+
+    def test_closure(self):
+        """Test ancestors and descendants through multiple inheritance."""
+        self.assertEqual([1, 2, 3, 4], self.hierarchy.ancestors(5).tolist())
+        self.assertEqual([2, 3, 4, 5], self.hierarchy.descendants(1).tolist())
+        self.assertEqual([4, 5], self.hierarchy.descendants(3).tolist())
+        self.assertEqual([], self.hierarchy.descendants(5).tolist())
+        self.assertTrue(self.hierarchy.is_descendant(5, 1))
+        self.assertFalse(self.hierarchy.is_descendant(1, 5))
+        self.assertFalse(self.hierarchy.is_descendant(3, 2))
+        self.assertFalse(self.hierarchy.is_descendant(3, 3))
+        self.assertTrue(self.hierarchy.is_descendant(3, 3, include_self=True))
+        self.assertFalse(self.hierarchy.is_descendant(99, 1))
+        self.assertEqual(
+            [False, False, True, True, False],
+            self.hierarchy.mask_descendants([1, 2, 4, 5, 99], 3).tolist(),
+        )
+
+    def test_round_trip(self):
+        """Test saving and memory-mapping the index."""
+        directory = Path(self.directory.name).joinpath("hierarchy")
+        self.hierarchy.save(directory)
+        hierarchy = SnomedHierarchy.load(directory)
+        self.assertEqual(len(self.hierarchy), len(hierarchy))
+        self.assertEqual([1, 2, 3, 4], hierarchy.ancestors(5).tolist())
+        self.assertTrue(hierarchy.is_descendant(4, 2))
+
+    def test_cycle(self):
+        """Test that a cycle is reported."""
+        relationships = load_snomed_relationships(
+            make_archive(Path(self.directory.name).joinpath("snomed.zip"))
+        )
+        relationships = relationships._replace(
+            source_ids=np.append(relationships.source_ids, 1),
+            destination_ids=np.append(relationships.destination_ids, 5),
+            type_ids=np.append(relationships.type_ids, IS_A),
+        )
+        with self.assertRaises(ValueError):
+            build_snomed_hierarchy(relationships)
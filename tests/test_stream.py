@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for decoding zip archives while they download."""
+
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from umls_downloader.stream import iter_zip_stream
+from umls_downloader.umls import open_umls
+
+from .mocks import MockResponse
+
+MEMBERS = {
+    "2023AB/META/MRCOLS.RRF": b"",
+    "2023AB/META/MRCONSO.RRF": b"".join(
+        f"C{i:07d}|ENG|P|L{i:07d}|PF|S{i:07d}|Y|A{i:07d}|||D{i}|MSH|MH|D{i}|name {i}|0|N|256|\n".encode()
+        for i in range(2000)
+    ),
+    "2023AB/README.txt": b"hello",
+}
+
+
+class _Unseekable(io.RawIOBase):
+    """A file that can only be written, which makes :mod:`zipfile` write data descriptors."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        return self.buffer.write(data)
+
+
+def make_archive(compression: int = zipfile.ZIP_DEFLATED, seekable: bool = True) -> bytes:
+    """Make an archive with a few members."""
+    file = io.BytesIO() if seekable else _Unseekable()
+    with zipfile.ZipFile(file, mode="w", compression=compression) as zip_file:
+        for name, data in MEMBERS.items():
+            zip_file.writestr(name, data)
+    return file.getvalue() if seekable else file.buffer.getvalue()
+
+
+def chunk(data: bytes, size: int):
+    """Split bytes into chunks."""
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class TestStream(unittest.TestCase):
+    """Test the streaming zip decoder."""
+
+    def test_members(self):
+        """Test all members are decoded, regardless of compression and chunk size."""
+        for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            for seekable in (True, False):
+                if compression == zipfile.ZIP_STORED and not seekable:
+                    continue
+                data = make_archive(compression, seekable)
+                for size in (1, 7, 1 << 16):
+                    with self.subTest(compression=compression, seekable=seekable, size=size):
+                        self.assertEqual(
+                            MEMBERS,
+                            {
+                                name: file.read()
+                                for name, file in iter_zip_stream(chunk(data, size))
+                            },
+                        )
+
+    def test_zip64(self):
+        """Test members with zip64 data descriptors, like from large archives written in a stream."""
+        file = _Unseekable()
+        with zipfile.ZipFile(file, mode="w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+            for name, data in MEMBERS.items():
+                with zip_file.open(name, mode="w", force_zip64=True) as member:
+                    member.write(data)
+        self.assertEqual(
+            MEMBERS,
+            {name: f.read() for name, f in iter_zip_stream(chunk(file.buffer.getvalue(), 13))},
+        )
+
+    def test_skip(self):
+        """Test that members that are partially read or not read at all are skipped."""
+        data = make_archive()
+        names = []
+        for name, file in iter_zip_stream(chunk(data, 100)):
+            names.append(name)
+            if name.endswith("MRCONSO.RRF"):
+                self.assertEqual(b"C0000000|ENG|", file.readline()[:13])
+        self.assertEqual(list(MEMBERS), names)
+
+    def test_bad_crc(self):
+        """Test that a corrupted member is detected."""
+        data = bytearray(make_archive(zipfile.ZIP_STORED))
+        index = data.index(b"hello")
+        data[index] = ord("j")
+        with self.assertRaises(zipfile.BadZipFile):
+            for _name, file in iter_zip_stream([bytes(data)]):
+                file.read()
+
+    def test_truncated(self):
+        """Test that a truncated archive is detected."""
+        data = make_archive()
+        with self.assertRaises(zipfile.BadZipFile):
+            for _name, file in iter_zip_stream([data[:1000]]):
+                file.read()
+
+
+class TestOpenStream(unittest.TestCase):
+    """Test opening MRCONSO while it downloads."""
+
+    def setUp(self) -> None:
+        """Point pystow at a temporary directory and mock out the service ticket."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.patches = [
+            mock.patch.dict(os.environ, {"PYSTOW_HOME": self.directory.name}),
+            mock.patch("umls_downloader.api._get_service_ticket", return_value="ST-1"),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.path = Path(self.directory.name).joinpath(
+            "bio", "umls", "2023AB", "umls-2023AB-mrconso.zip"
+        )
+        self.data = make_archive(seekable=False)
+        self.response = MockResponse(200, self.data, {"ETag": '"v1"'}, chunk_size=100)
+
+    def tearDown(self) -> None:
+        """Clean up the temporary directory and mocks."""
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.directory.cleanup()
+
+    def test_stream(self):
+        """Test rows are available before the download is done, and the archive is cached."""
+        with mock.patch("umls_downloader.api.requests.get", return_value=self.response) as get:
+            with open_umls(version="2023AB", stream=True) as file:
+                self.assertEqual(b"C0000000|ENG|", file.readline()[:13])
+                self.assertLess(self.response.consumed, len(self.data))
+            self.assertEqual(self.data, self.path.read_bytes())
+            self.assertTrue(self.path.with_name(self.path.name + ".validators.json").is_file())
+            # now that it's cached, it's read from the file
+            with open_umls(version="2023AB", stream=True) as file:
+                self.assertEqual(MEMBERS["2023AB/META/MRCONSO.RRF"], file.read())
+        get.assert_called_once()
+
+    def test_error(self):
+        """Test that an error while reading doesn't leave a partial archive in the cache."""
+        with mock.patch("umls_downloader.api.requests.get", return_value=self.response):
+            with self.assertRaises(KeyError):
+                with open_umls(version="2023AB", stream=True):
+                    raise KeyError
+        self.assertFalse(self.path.exists())
+        self.assertFalse(self.path.with_name(self.path.name + ".part").exists())
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for synchronizing the cache with a manifest."""
+
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from umls_downloader.api import RateLimiter
+from umls_downloader.sync import load_manifest, plan_sync, sync
+
+MANIFEST = """\
+concurrency: 1
+resources:
+  - resource: umls
+    version: 2023AB
+    priority: 2
+  - resource: rxnorm
+    version: 2023-08-07
+  - resource: semmeddb
+    files: [predication]
+    priority: 1
+"""
+
+
+class TestSync(unittest.TestCase):
+    """Test planning and running a sync."""
+
+    def setUp(self) -> None:
+        """Point pystow at a temporary directory and write a manifest."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.patch = mock.patch.dict(os.environ, {"PYSTOW_HOME": self.directory.name})
+        self.patch.start()
+        path = Path(self.directory.name).joinpath("manifest.yaml")
+        path.write_text(MANIFEST)
+        self.manifest = load_manifest(path)
+
+    def tearDown(self) -> None:
+        """Clean up the temporary directory."""
+        self.patch.stop()
+        self.directory.cleanup()
+
+    def test_plan(self):
+        """Test planning orders by priority and skips cached files."""
+        tasks = plan_sync(self.manifest)
+        self.assertEqual(["rxnorm", "semmeddb", "umls"], [task.resource for task in tasks])
+        self.assertEqual("RxNorm_full_08072023.zip", tasks[0].path.name)
+        self.assertEqual(
+            Path(self.directory.name).joinpath("bio", "umls", "2023AB", "umls-2023AB-mrconso.zip"),
+            tasks[2].path,
+        )
+        tasks[0].path.write_text("")
+        self.assertEqual(["semmeddb", "umls"], [task.resource for task in plan_sync(self.manifest)])
+        self.assertEqual(3, len(plan_sync(self.manifest, force=True)))
+
+    def test_duplicates(self):
+        """Test a file listed more than once is only downloaded once, with the lowest priority."""
+        tasks = plan_sync(
+            {
+                "resources": [
+                    {"resource": "umls", "version": "2023AB", "priority": 2},
+                    {"resource": "semmeddb", "files": ["predication"], "priority": 3},
+                    {"resource": "semmeddb", "priority": 1},
+                    {"resource": "umls", "version": "2023AB"},
+                ]
+            }
+        )
+        self.assertEqual(len(tasks), len({task.path for task in tasks}))
+        self.assertEqual(7, len(tasks))
+        priorities = {task.path.name: task.priority for task in tasks}
+        self.assertEqual(0, priorities["umls-2023AB-mrconso.zip"])
+        self.assertEqual(1, priorities["semmedVER43_2021_R_PREDICATION.csv.gz"])
+
+    def test_invalid(self):
+        """Test invalid manifests."""
+        with self.assertRaises(ValueError):
+            plan_sync({"resources": [{"resource": "mesh"}]})
+        with self.assertRaises(ValueError):
+            plan_sync({"resources": [{"resource": "snomed_us", "version": "20220301"}]})
+        with self.assertRaises(ValueError):
+            plan_sync({"resources": [{"resource": "semmeddb", "files": ["nope"]}]})
+
+    def test_sync(self):
+        """Test downloads happen in priority order and failures are reported at the end."""
+        calls = []
+
+        def _download(url, path, **kwargs):
+            calls.append(url)
+            if "umls" in Path(path).name:
+                raise OSError
+
+        with mock.patch("umls_downloader.sync.download_tgt", side_effect=_download):
+            with self.assertRaises(RuntimeError):
+                sync(self.manifest, bandwidth="10M")
+        self.assertEqual(3, len(calls))
+        self.assertIn("rxnorm", calls[0])
+        self.assertIn("PREDICATION", calls[1])
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test the token bucket."""
+
+    def test_rate(self):
+        """Test consuming more than the burst blocks."""
+        rate_limiter = RateLimiter(rate=1000)
+        start = time.monotonic()
+        rate_limiter.consume(1000)
+        self.assertLess(time.monotonic() - start, 0.05)
+        rate_limiter.consume(100)
+        self.assertGreater(time.monotonic() - start, 0.05)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for UMLS content built on top of MRCONSO."""
+
+import io
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from umls_downloader.frame import load_umls_frame
+from umls_downloader.graph import UMLSGraph, build_umls_graph
+from umls_downloader.umls import ensure_umls_subset, open_umls_subset
+
+#: CUI, LAT, AUI, SAB, TTY, STR, SUPPRESS
+ROWS = [
+    ("C0000005", "ENG", "A26634265", "MSH", "PEP", "(131)I-Macroaggregated Albumin", "N"),
+    ("C0000005", "ENG", "A26634266", "MSH", "ET", "(131)I-MAA", "N"),
+    ("C0000039", "ENG", "A0016515", "MSH", "MH", "1,2-Dipalmitoylphosphatidylcholine", "N"),
+    ("C0000039", "FRE", "A28315139", "MSHFRE", "MH", "1,2-Dipalmitoylphosphatidylcholine", "N"),
+    ("C0000039", "ENG", "A0100000", "RXNORM", "IN", "dipalmitoylphosphatidylcholine", "O"),
+    ("C0027051", "ENG", "A0100001", "SNOMEDCT_US", "PT", "Myocardial infarction", "N"),
+]
+
+
+def make_mrconso(directory: Path, version: str = "2023AB") -> Path:
+    """Write a tiny MRCONSO archive in the same place as the versioned cache would."""
+    path = directory.joinpath(version, f"umls-{version}-mrconso.zip")
+    path.parent.mkdir(parents=True)
+    lines = "".join(
+        f"{cui}|{lat}|P|L0000005|PF|S0007492|Y|{aui}|||D012711|{sab}|{tty}|D012711|{name}|0|{suppress}|256|\n"
+        for cui, lat, aui, sab, tty, name, suppress in ROWS
+    )
+    with zipfile.ZipFile(path, mode="w") as zip_file:
+        zip_file.writestr(f"{version}/META/MRCONSO.RRF", lines)
+    return path
+
+
+class MRCONSOTestCase(unittest.TestCase):
+    """A test case with a temporary MRCONSO archive in place of the downloaded one."""
+
+    def setUp(self) -> None:
+        """Write a temporary MRCONSO archive and patch downloading it."""
+        self.directory = tempfile.TemporaryDirectory()
+        path = make_mrconso(Path(self.directory.name))
+        self.patch = mock.patch("umls_downloader.umls.download_umls", return_value=path)
+        self.patch.start()
+
+    def tearDown(self) -> None:
+        """Clean up the temporary directory."""
+        self.patch.stop()
+        self.directory.cleanup()
+
+
+class TestSubset(MRCONSOTestCase):
+    """Test cached, filtered subsets of MRCONSO."""
+
+    def test_subset(self):
+        """Test filtering on sources, languages, and suppression."""
+        with open_umls_subset(sabs=["RXNORM", "MSH"], languages=["ENG"]) as file:
+            self.assertEqual(
+                ["A26634265", "A26634266", "A0016515", "A0100000"],
+                [line.decode("utf-8").split("|")[7] for line in file],
+            )
+        with open_umls_subset(include_suppressed=False, languages=["ENG"]) as file:
+            self.assertEqual(4, len(file.readlines()))
+
+    def test_single_string(self):
+        """Test that a single source isn't split into its characters."""
+        with self.assertRaises(TypeError):
+            ensure_umls_subset(sabs="MSH")
+        with self.assertRaises(TypeError):
+            ensure_umls_subset(languages="ENG")
+
+    def test_cache(self):
+        """Test the same filters in a different order give the same file, without rebuilding."""
+        path = ensure_umls_subset(sabs=["MSH", "RXNORM"], include_suppressed=False)
+        self.assertEqual("2023AB", path.parent.parent.name)
+        self.assertTrue(path.with_suffix(".json").is_file())
+        path.write_bytes(b"cached\n")
+        self.assertEqual(
+            path, ensure_umls_subset(sabs=("RXNORM", "MSH", "MSH"), include_suppressed=False)
+        )
+        self.assertEqual(b"cached\n", path.read_bytes())
+        self.assertNotEqual(path, ensure_umls_subset(sabs=["MSH", "RXNORM"]))
+
+
+class TestFrame(MRCONSOTestCase):
+    """Test loading MRCONSO as a categorical frame."""
+
+    def test_encoding(self):
+        """Test columns are encoded compactly and can be decoded."""
+        frame = load_umls_frame()
+        self.assertEqual(len(ROWS), len(frame))
+        self.assertEqual("int32", frame["CUI"].dtype.name)
+        self.assertEqual([5, 5, 39, 39, 39, 27051], frame["CUI"].tolist())
+        self.assertEqual("uint8", frame["SAB"].dtype.name)
+        self.assertEqual(["MSH", "MSHFRE", "RXNORM", "SNOMEDCT_US"], frame.categories["SAB"])
+        for column, index in [("CUI", 0), ("LAT", 1), ("AUI", 2), ("SAB", 3), ("STR", 5)]:
+            with self.subTest(column=column):
+                self.assertEqual([row[index] for row in ROWS], frame.decode(column).tolist())
+
+    def test_columns(self):
+        """Test selecting columns."""
+        frame = load_umls_frame(columns=["CUI", "SAB"])
+        self.assertEqual(["CUI", "SAB"], list(frame.columns))
+        with self.assertRaises(ValueError):
+            load_umls_frame(columns=["CUI", "NOPE"])
+
+    def test_pandas(self):
+        """Test converting to pandas."""
+        try:
+            import pandas  # noqa:F401
+        except ImportError:
+            self.skipTest("pandas is not installed")
+        df = load_umls_frame(columns=["CUI", "TTY", "STR"]).to_pandas()
+        self.assertEqual("category", df["TTY"].dtype.name)
+        self.assertEqual(["PEP", "ET", "MH", "MH", "IN", "PT"], df["TTY"].astype(str).tolist())
+
+
+#: CUI1, REL, CUI2, RELA, SAB, SUPPRESS
+RELATIONSHIPS = [
+    ("C0027051", "PAR", "C0018799", "isa", "MSH", "N"),
+    ("C0027051", "PAR", "C0018799", "isa", "SNOMEDCT_US", "N"),
+    ("C0018799", "CHD", "C0027051", "inverse_isa", "MSH", "N"),
+    ("C0018799", "PAR", "C0007222", "", "MSH", "N"),
+    ("C0004057", "RO", "C0027051", "may_treat", "MED-RT", "N"),
+    ("C0004057", "RO", "C0018681", "may_treat", "MED-RT", "O"),
+    ("C0027051", "RO", "C0004057", "may_be_treated_by", "MED-RT", "N"),
+]
+
+
+def _mrrel() -> io.BytesIO:
+    return io.BytesIO(
+        "".join(
+            f"{cui1}|A1|SCUI|{rel}|{cui2}|A2|SCUI|{rela}|R1||{sab}|{sab}|||{suppress}||\n"
+            for cui1, rel, cui2, rela, sab, suppress in RELATIONSHIPS
+        ).encode("utf-8")
+    )
+
+
+class TestGraph(unittest.TestCase):
+    """Test the MRREL graph."""
+
+    def test_single_string(self):
+        """Test that a single source isn't split into its characters."""
+        with self.assertRaises(TypeError):
+            build_umls_graph(_mrrel(), sabs="MSH")
+
+    def test_graph(self):
+        """Test neighbor queries and typed-path expansion."""
+        graph = build_umls_graph(_mrrel())
+        self.assertEqual(6, graph.number_of_edges)
+        self.assertEqual(["C0018799"], graph.neighbors("C0027051", "PAR"))
+        self.assertEqual(["C0018799"], graph.neighbors("C0027051", rela="isa"))
+        self.assertEqual([], graph.neighbors("C0027051", rela="nope"))
+        self.assertEqual([], graph.neighbors("C9999999"))
+        self.assertEqual(
+            [("RO", "may_be_treated_by", "C0004057"), ("PAR", "isa", "C0018799")],
+            graph.edges("C0027051"),
+        )
+        self.assertEqual(
+            ["C0007222"], graph.expand(["C0004057"], [("RO", "may_treat"), "PAR", "PAR"])
+        )
+        self.assertEqual(
+            ["C0018681", "C0027051"], graph.expand(["C0004057"], [(None, "may_treat")])
+        )
+
+    def test_filters(self):
+        """Test filtering sources and suppressed relationships while loading."""
+        graph = build_umls_graph(_mrrel(), sabs=["MED-RT"], include_suppressed=False)
+        self.assertEqual(2, graph.number_of_edges)
+        self.assertEqual(["C0027051"], graph.neighbors("C0004057"))
+        self.assertEqual([], graph.neighbors("C0027051", "PAR"))
+
+    def test_round_trip(self):
+        """Test saving and memory-mapping the graph."""
+        graph = build_umls_graph(_mrrel())
+        with tempfile.TemporaryDirectory() as directory:
+            graph.save(directory)
+            loaded = UMLSGraph.load(directory)
+            self.assertEqual(graph.edges("C0027051"), loaded.edges("C0027051"))
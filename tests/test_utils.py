@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for utilities."""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from umls_downloader.utils import load_arrays, save_arrays
+
+
+class TestArrays(unittest.TestCase):
+    """Test saving and loading directories of arrays."""
+
+    def setUp(self) -> None:
+        """Make a temporary directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tmp.name).joinpath("index")
+
+    def tearDown(self) -> None:
+        """Clean up the temporary directory."""
+        self.tmp.cleanup()
+
+    def test_overwrite(self):
+        """Test that saving replaces an existing index without leaving anything behind."""
+        save_arrays(self.directory, {"a": np.arange(3), "b": np.arange(2)})
+        save_arrays(self.directory, {"a": np.arange(5)})
+        arrays = load_arrays(self.directory)
+        self.assertEqual({"a"}, set(arrays))
+        self.assertEqual([0, 1, 2, 3, 4], arrays["a"].tolist())
+        self.assertEqual(["index"], [path.name for path in Path(self.tmp.name).iterdir()])
+
+    def test_refuse(self):
+        """Test that a directory that isn't an index isn't overwritten."""
+        self.directory.mkdir()
+        path = self.directory.joinpath("important.txt")
+        path.write_text("keep me")
+        with self.assertRaises(FileExistsError):
+            save_arrays(self.directory, {"a": np.arange(3)})
+        self.assertEqual("keep me", path.read_text())